@@ -1,23 +1,53 @@
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
 from GameObject import GameObject
 from Hero import Hero
+from ThresholdedImage import ThresholdedImage
+from Instrumentation import Instrumentation
+
+
+worker_heroes = None  # AllHeroes of a hero identification worker process, created by its first hero
+
+
+def identify_hero_in_worker(game_version, matcher, this_hero, this_hero_img, view):
+    """ Identifies a hero in a worker process, loading the references the first time the process is used
+
+    :param game_version: String of the game version
+    :param matcher: String of the matcher to identify heroes with
+    :param this_hero: Hero object to identify
+    :param this_hero_img: Numpy array of the hero's crop of the screen shot
+    :param view: String of the current view in the screen shot
+    :return: Tuple (Boolean if successfully identified hero, the updated Hero object)
+    """
+    global worker_heroes
+    if worker_heroes is None:
+        worker_heroes = AllHeroes(game_version, 0, matcher=matcher)
+    result = worker_heroes.identify_hero_image(this_hero_img, this_hero, view)
+    return result, this_hero
 
 
 class AllHeroes(GameObject):
 
-    def __init__(self, game_version, debug_mode):
+    def __init__(self, game_version, debug_mode, workers=0, matcher="exhaustive"):
         self.game_version = game_version
         self.debugMode = debug_mode
+        self.matcher = matcher  # "exhaustive", "cascade" or "verify", see GameObject.matcher
+        self.workers = workers  # identify heroes across this many processes, 0 to identify them one after another
+        self.pool = None
         self.characterReferences = self.read_references("Reference\\HeroImageList.txt")
         self.characterReferencesX = self.read_references("Reference\\HeroImageListX.txt")
         self.characterBlurReferences = self.read_references("Reference\\HeroImageBlurList.txt")
         self.respawnFilter = self.read_references("Reference\\RespawnFilter.txt")
+        # references grouped by hero, e.g. every "tracer-..." variant
+        self.characterPartitions = self.characterReferences.partitions()
+        self.characterPartitionsX = self.characterReferencesX.partitions()
         self.heroesDictionary = {}
         self.heroesList = []
+        self.slotSpanNames = {}  # built once, so no strings are built every tick while instrumentation is off
         for x in range(1, 13):
             self.heroesDictionary[x] = Hero(x)
+            self.slotSpanNames[x] = "hero slot " + str(x)
 
     def main(self, screen_image_array, current_time, current_view):
         """ Process the saved screen shot to see what heroes are selected
@@ -34,6 +64,11 @@ class AllHeroes(GameObject):
         elif current_view == "Tab":
             hero_range = range(1, 13)
 
+        if self.workers:
+            results = self.identify_heroes_in_pool(screen_image_array, hero_range, current_view)
+        else:
+            results = None
+
         failed_heroes = []
         for hero_number in hero_range:
             # If more than half of the heroes fail, it is probably because they are still fading in from Tab view
@@ -42,8 +77,16 @@ class AllHeroes(GameObject):
             this_hero = self.heroesDictionary[hero_number]
             this_hero.hero_changed = False  # To prevent reverting to previous hero
 
-            result = self.identify_hero(screen_image_array, this_hero, current_view)
+            with Instrumentation.span(self.slotSpanNames[hero_number]):
+                if results is None:
+                    result = self.identify_hero(screen_image_array, this_hero, current_view)
+                else:
+                    result = results[hero_number]
+                    if result is not True:
+                        result, identified_hero = result.result()
+                        this_hero.copy_identification(identified_hero)
             if not result:
+                Instrumentation.count("hero failed")
                 failed_heroes.append(hero_number)
                 print(str(hero_number) + " Failed")
             else:
@@ -71,6 +114,50 @@ class AllHeroes(GameObject):
                         enemy_hero.revert_previous_hero()
         return True
 
+    def identify_heroes_in_pool(self, screen_img_array, hero_range, view):
+        """ Sends the crops of the heroes whose image changed to the worker processes
+
+        :param screen_img_array: Numpy array of the screen shot
+        :param hero_range: Range of hero numbers to identify
+        :param view: String of the current view in the screen shot
+        :return: Dictionary of hero numbers to True if the image is unchanged, otherwise a Future of a Tuple
+        (Boolean if successfully identified hero, the updated Hero object)
+        """
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        results = {}
+        for hero_number in hero_range:
+            this_hero = self.heroesDictionary[hero_number]
+            this_hero_img = self.crop_hero(screen_img_array, this_hero, view)
+            if this_hero.identifiedView == view and self.image_unchanged(this_hero.currentImageArray, this_hero_img):
+                results[hero_number] = True
+            else:
+                this_hero.hero_changed = False
+                results[hero_number] = self.pool.submit(identify_hero_in_worker, self.game_version, self.matcher,
+                                                        this_hero, this_hero_img, view)
+        return results
+
+    def close(self):
+        """ Shuts down the worker processes, if any were started
+
+        :return: None
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def capture_regions(self):
+        """ Lists the regions of the screen read when identifying heroes in either view
+
+        :return: List of dimensions dictionaries
+        """
+        regions = []
+        for hero_number, hero in self.heroesDictionary.items():
+            regions.append(hero.screenPositionTab)
+            regions.append(hero.screenPositionCharacterSelect)
+        return regions
+
     def heroes_to_list(self):
         """ Pulls the currently selected heroes and converts them to integers in a list.
         Also compares this list to the previous list to detect changes
@@ -99,46 +186,59 @@ class AllHeroes(GameObject):
         :param view: String of the current view in the screen shot
         :return Boolean if successfully identified hero
         """
+        this_hero_img = self.crop_hero(screen_img_array, this_hero, view)
+
+        # 0) reuse the previous identification if the hero's image has not changed
+        if this_hero.identifiedView == view and self.image_unchanged(this_hero.currentImageArray, this_hero_img):
+            Instrumentation.count("hero reused")
+            return True
+
+        return self.identify_hero_image(this_hero_img, this_hero, view)
+
+    @staticmethod
+    def crop_hero(screen_img_array, this_hero, view):
+        """ Crops the screen shot to the requested hero based on the current view
 
+        :param screen_img_array: Numpy array of the screen shot
+        :param this_hero: Hero object to crop to
+        :param view: String of the current view in the screen shot
+        :return: Numpy array of the hero's crop of the screen shot
+        """
         if view == "Tab":
             hero_coordinates = this_hero.screenPositionTab
         else:
             hero_coordinates = this_hero.screenPositionCharacterSelect
 
-        this_hero_img = screen_img_array[
-                        hero_coordinates["start_y"]: hero_coordinates["end_y"],
-                        hero_coordinates["start_x"]: hero_coordinates["end_x"]
-                        ]  # crop to Hero
-        # Make Black & White based off average value
-        this_hero_img_threshold = self.threshold(np.asarray(this_hero_img))
-        this_hero_img_threshold_respawning = self.threshold(np.asarray(this_hero_img), respawn_filter=True)
+        return screen_img_array[
+               hero_coordinates["start_y"]: hero_coordinates["end_y"],
+               hero_coordinates["start_x"]: hero_coordinates["end_x"]
+               ]  # crop to Hero
+
+    def identify_hero_image(self, this_hero_img, this_hero, view):
+        """ Identifies the requested hero from its crop of the screen shot
+
+        :param this_hero_img: Numpy array of the hero's crop of the screen shot
+        :param this_hero: Hero object to identify
+        :param view: String of the current view in the screen shot
+        :return Boolean if successfully identified hero
+        """
+        # Make Black & White based off average value, the respawning version only if it is needed
+        this_hero_img_threshold = ThresholdedImage(self, this_hero_img)
         this_hero.set_image_array(this_hero_img)  # save IMG to Hero
 
         all_potential = {}
-        this_hero_references = {}
-        this_hero_references_x = {}
-        other_hero_references = {}
-        other_hero_references_x = {}
 
         # 1) check if it is the same hero as previously
         if this_hero.currentHero is not None:
-            for character, reference in self.characterReferences.items():
-                character_split = character.split("-")
-                if character_split[0] == this_hero.currentHero:
-                    this_hero_references[character] = reference
-                else:
-                    other_hero_references[character] = reference
-            result = self.get_hero_from_potential(this_hero, this_hero_img_threshold, this_hero_references,
+            this_hero_references = self.characterPartitions.only(this_hero.currentHero)
+            other_hero_references = self.characterPartitions.all_except(this_hero.currentHero)
+            result = self.get_hero_from_potential(this_hero, this_hero_img_threshold.mask(), this_hero_references,
                                                   all_potential)
             if not result:
                 # check if respawning
-                for character, reference in self.characterReferencesX.items():
-                    character_split = character.split("-")
-                    if character_split[0] == this_hero.currentHero:
-                        this_hero_references_x[character] = reference
-                    else:
-                        other_hero_references_x[character] = reference
-                result = self.get_hero_from_potential(this_hero, this_hero_img_threshold_respawning,
+                this_hero_references_x = self.characterPartitionsX.only(this_hero.currentHero)
+                other_hero_references_x = self.characterPartitionsX.all_except(this_hero.currentHero)
+                result = self.get_hero_from_potential(this_hero, this_hero_img_threshold.mask(respawn_filter=True),
                                                       this_hero_references_x, all_potential, respawn_filter=True)
         else:
             other_hero_references = self.characterReferences
@@ -148,17 +248,23 @@ class AllHeroes(GameObject):
         # 2) check for blurred versions if on hero select and slot number is 1
         if not result:
             if view == "Hero Select" and this_hero.slotNumber == 1:
-                result = self.get_hero_from_potential(this_hero, this_hero_img_threshold, self.characterBlurReferences,
-                                                      all_potential, correct_hero_threshold=0.85)
+                result = self.get_hero_from_potential(this_hero, this_hero_img_threshold.mask(),
+                                                      self.characterBlurReferences, all_potential,
+                                                      correct_hero_threshold=0.85)
 
         # 3) check standard array of heroes
         if not result:
-            result = self.get_hero_from_potential(this_hero, this_hero_img_threshold, other_hero_references,
+            result = self.get_hero_from_potential(this_hero, this_hero_img_threshold.mask(), other_hero_references,
                                                   all_potential)
             if not result:
                 # check if respawning
-                result = self.get_hero_from_potential(this_hero, this_hero_img_threshold_respawning,
+                result = self.get_hero_from_potential(this_hero, this_hero_img_threshold.mask(respawn_filter=True),
                                                       other_hero_references_x, all_potential, respawn_filter=True)
+        # the crop is only reused while it is the one the hero was identified from
+        if result:
+            this_hero.identifiedView = view
+        else:
+            this_hero.identifiedView = None
         return result
 
     def get_hero_from_potential(self, this_hero, hero_image, character_references, all_potential,
@@ -166,7 +272,7 @@ class AllHeroes(GameObject):
         """ Compares the hero image with the references images
 
         :param this_hero: Hero object to identify
-        :param hero_image: Numpy array of the hero's image to identify
+        :param hero_image: Numpy array of the hero's black and white image (or mask) to identify
         :param character_references: Dictionary of reference hero images in list format
         :param all_potential: Dictionary of potentials (for debug saving)
         :param correct_hero_threshold: minimum score needed to confirm hero
@@ -176,7 +282,9 @@ class AllHeroes(GameObject):
         if len(character_references) == 0:
             return False
 
-        potential = self.what_image_is_this(hero_image, character_references, respawn_filter)  # compare to References
+        # compare to References
+        potential = self.what_image_is_this(hero_image, character_references, respawn_filter,
+                                            threshold=correct_hero_threshold)
         for name, name_potential in potential.items():
             all_potential[name] = name_potential
         this_hero.set_potential(all_potential)
@@ -200,7 +308,8 @@ class AllHeroes(GameObject):
     def broadcast_heroes(self, broadcaster):
         publish_list = ["heroes", self.heroesList]
         if broadcaster != "debug":
-            broadcaster.publish(broadcaster.subscriptionString, publish_list)
+            with Instrumentation.span("broadcast heroes"):
+                broadcaster.publish(broadcaster.subscriptionString, publish_list)
 
     def clear_enemy_heroes(self, broadcaster):
         for heroNumber, hero in self.heroesDictionary.items():
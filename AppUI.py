@@ -2,6 +2,8 @@ import tkinter
 import re
 import sys
 
+from Instrumentation import Instrumentation
+
 
 class AppUI(tkinter.Tk):
     def __init__(self, this_app_controller, loop, interval=0.01):
@@ -50,6 +52,8 @@ class AppUI(tkinter.Tk):
                        command=self.create_digit_images).pack(fill="x")
         tkinter.Button(developer_tools_window, text="Digit Reference: Create TXT",
                        command=self.create_digit_references).pack(fill="x")
+        tkinter.Button(developer_tools_window, text="Timing Summary",
+                       command=self.dump_instrumentation).pack(fill="x")
 
     def get_group_id(self):
         self.mainMenuWindow.destroy()
@@ -130,10 +134,15 @@ class AppUI(tkinter.Tk):
     def create_digit_references(self):
         self.thisAppController.create_digit_references()
 
+    def dump_instrumentation(self):
+        Instrumentation.dump()
+
     def updater(self, interval):
         self.update()
         self.loop.call_later(interval, self.updater, interval)
 
     def close(self):
+        if self.thisAppController.gameObject is not None:
+            self.thisAppController.close_game().result()
         self.loop.stop()
         sys.exit()
@@ -0,0 +1,212 @@
+import argparse
+from collections import defaultdict
+from collections.abc import Sequence
+import json
+from os.path import basename
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from Game import Game
+from ReferenceRegistry import ReferenceRegistry
+from ScreenCapture import open_replay_backend
+
+
+class Benchmark:
+    """ Replays a corpus of recorded frames through the Game pipeline and reports how long each stage takes,
+    the frames per second, the peak memory and, given labelled frames, how often the results agree with the labels
+    """
+
+    # stage name: (Game attribute, function name)
+    stages = {
+        "capture": ("capture", "grab"),
+        "map": ("map", "main"),
+        "heroes": ("heroes", "main"),
+        "objective": ("map", "identify_objective_progress"),
+        "time": ("gameTime", "main"),
+    }
+
+    def __init__(self, path, game_version="1.26", hero_workers=0, matcher="exhaustive", labels=None):
+        """
+        :param path: String of a .png screen shot, a directory of screen shots or a .npy frame dump
+        :param game_version: String of the game version of the recorded frames
+        :param hero_workers: Int of processes to identify heroes with
+        :param matcher: String of the matcher to identify heroes with
+        :param labels: Dictionary of frame names to their expected "view", "map", "heroes" and "objective"
+        """
+        self.path = path
+        self.game_version = game_version
+        self.hero_workers = hero_workers
+        self.matcher = matcher
+        self.labels = labels or {}
+
+        self.timings = defaultdict(list)
+        self.stageResults = {}  # last result of each stage, e.g. the view from MapInfo.main
+        self.accuracy = defaultdict(lambda: {"agree": 0, "total": 0})
+
+    def create_game(self):
+        backend = open_replay_backend(self.path)
+        return Game(self.game_version, (0, 0) + backend.size, 0, backend, hero_workers=self.hero_workers,
+                    matcher=self.matcher)
+
+    def time_stages(self, game):
+        """ Wraps the stage functions of the game, so every call is timed
+
+        :param game: Game object to time
+        :return: None
+        """
+        for stage, (attribute, function_name) in self.stages.items():
+            game_object = getattr(game, attribute)
+            setattr(game_object, function_name, self.timed(getattr(game_object, function_name), stage))
+
+    def timed(self, function, stage):
+        def timed_function(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                self.stageResults[stage] = function(*args, **kwargs)
+                return self.stageResults[stage]
+            finally:
+                self.timings[stage].append(time.perf_counter() - start_time)
+        return timed_function
+
+    def run(self):
+        """ Replays every frame once to time it and check it against the labels, then once more to measure memory
+
+        :return: Dictionary of the results
+        """
+        game = self.create_game()
+        self.time_stages(game)
+        frame_count = 0
+        start_time = time.perf_counter()
+        while True:
+            tick_start_time = time.perf_counter()
+            game.main("debug")
+            self.timings["tick"].append(time.perf_counter() - tick_start_time)
+            self.check_labels(game, self.frame_name(game.capture.backend))
+            frame_count += 1
+            if not game.capture.next_frame():
+                break
+        duration = time.perf_counter() - start_time
+        game.close()
+
+        # tracemalloc slows the analysis down, so memory is measured on a separate replay, which loads the references
+        # again so they are included
+        ReferenceRegistry.clear()
+        tracemalloc.start()
+        game = self.create_game()
+        while True:
+            game.main("debug")
+            if not game.capture.next_frame():
+                break
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        game.close()
+
+        return {
+            "commit": self.commit(),
+            "path": self.path,
+            "matcher": self.matcher,
+            "hero_workers": self.hero_workers,
+            "frames": frame_count,
+            "frames_per_second": frame_count / duration,
+            "peak_memory_bytes": peak_memory,
+            "stages": {stage: self.percentiles(timings) for stage, timings in self.timings.items()},
+            "accuracy": dict(self.accuracy)
+        }
+
+    @staticmethod
+    def percentiles(timings):
+        """ Summarises the timings of a stage in milliseconds
+
+        :param timings: List of durations in seconds
+        :return: Dictionary of the count, mean and p50/p95/p99 latency
+        """
+        milliseconds = np.array(timings) * 1000
+        return {
+            "count": len(timings),
+            "mean_ms": float(milliseconds.mean()),
+            "p50_ms": float(np.percentile(milliseconds, 50)),
+            "p95_ms": float(np.percentile(milliseconds, 95)),
+            "p99_ms": float(np.percentile(milliseconds, 99))
+        }
+
+    @staticmethod
+    def frame_name(backend):
+        """ Names the current frame the way the labels do: the screen shot's filename, or the frame dump's index
+
+        :param backend: Replay backend of the game
+        :return: String of the frame name
+        """
+        if hasattr(backend, "filenames"):
+            return basename(backend.filenames[backend.frame_number])
+        return str(getattr(backend, "frame_number", 0))
+
+    def check_labels(self, game, frame_name):
+        """ Counts how many of the frame's labels agree with what the game identified
+
+        :param game: Game object that just analysed the frame
+        :param frame_name: String of the frame name
+        :return: None
+        """
+        label = self.labels.get(frame_name)
+        if label is None:
+            return
+        if "view" in label:
+            self.count_agreement("view", label["view"], self.stageResults.get("map"))
+        if "map" in label:
+            current_map = None
+            if game.map.current_map[0] is not None:
+                current_map = game.map.get_current_map()
+            self.count_agreement("map", label["map"], current_map)
+        if "heroes" in label:
+            for hero_number, hero_name in enumerate(label["heroes"], 1):
+                if hero_name is not None:
+                    self.count_agreement("heroes", hero_name, game.heroes.heroesDictionary[hero_number].currentHero)
+        if "objective" in label:
+            for key, value in label["objective"].items():
+                self.count_agreement("objective", value, game.map.objectiveProgress.get(key))
+
+    def count_agreement(self, category, expected, identified):
+        if isinstance(identified, Sequence) and not isinstance(identified, str):
+            identified = list(identified)  # e.g. the escort progress deque, labelled as a JSON list
+        self.accuracy[category]["total"] += 1
+        if expected == identified:
+            self.accuracy[category]["agree"] += 1
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def main():
+        parser = argparse.ArgumentParser(description="Benchmark the Game pipeline on recorded frames")
+        parser.add_argument("path", help="a .png screen shot, a directory of screen shots or a .npy frame dump")
+        parser.add_argument("--version", default="1.26", help="game version of the recorded frames")
+        parser.add_argument("--hero-workers", type=int, default=0, help="processes to identify heroes with")
+        parser.add_argument("--matcher", default="exhaustive", help="exhaustive, cascade or verify")
+        parser.add_argument("--labels", help="JSON file of frame names to their expected view, map, heroes and "
+                                             "objective progress")
+        parser.add_argument("--output", help="JSON file to write the results to")
+        arguments = parser.parse_args()
+
+        labels = None
+        if arguments.labels:
+            with open(arguments.labels) as labels_file:
+                labels = json.load(labels_file)
+
+        results = Benchmark(arguments.path, arguments.version, arguments.hero_workers, arguments.matcher,
+                            labels).run()
+        results_json = json.dumps(results, indent=4)
+        if arguments.output:
+            with open(arguments.output, "w") as output_file:
+                output_file.write(results_json)
+        print(results_json)
+
+
+if __name__ == "__main__":
+    Benchmark.main()
@@ -1,5 +1,3 @@
-from PIL import ImageGrab
-import numpy as np
 from datetime import datetime
 import copy
 import time
@@ -8,29 +6,52 @@ from Statistics import Statistics
 from AllHeroes import AllHeroes
 from MapInfo import MapInfo
 from TimeInfo import TimeInfo
+from ScreenCapture import ScreenCapture, ImageGrabBackend
+from TickScheduler import TickScheduler
+from Instrumentation import Instrumentation
 
 
 class Game:
-    def __init__(self, game_version, bbox, debug_mode):
+    def __init__(self, game_version, bbox, debug_mode, capture_backend=None, scheduler=None, hero_workers=0,
+                 matcher="exhaustive"):
         self.game_version = game_version
         self.bbox = bbox
         self.debugMode = debug_mode
-        self.heroes = AllHeroes(game_version, debug_mode)
+        if capture_backend is None:
+            capture_backend = ImageGrabBackend(bbox)
+        self.capture = ScreenCapture(capture_backend)
+        self.objective_captured = False
+        if scheduler is None:
+            scheduler = TickScheduler()
+        self.scheduler = scheduler
+        self.previous_objective_progress = None
+        self.heroes = AllHeroes(game_version, debug_mode, hero_workers, matcher)
         self.map = MapInfo(game_version, debug_mode)
         # self.statistics = None
         self.gameTime = TimeInfo(game_version, debug_mode)
         self.game_over = True
 
+    def close(self):
+        """ Releases what the game started, to be called before it is replaced or the app exits
+
+        :return: None
+        """
+        self.heroes.close()
+
     def main(self, broadcaster):
         start_time = time.time()  # for calculating sleep time
 
         current_time = datetime.now()
         current_time_string = datetime.strftime(current_time, "%m-%d-%y %H-%M-%S")
 
-        screen_img_array = self.get_screen()
+        Instrumentation.count("ticks")
+        with Instrumentation.span("capture"):
+            screen_img_array = self.get_screen(self.capture_regions())
 
-        current_view = self.map.main(screen_img_array, current_time_string)
+        with Instrumentation.span("view"):
+            current_view = self.map.main(screen_img_array, current_time_string)
         if current_view:
+            Instrumentation.count("view " + current_view)
             print(self.map.get_current_map())
             print(current_view)
 
@@ -59,13 +80,16 @@ class Game:
 
             if not heroes_result:
                 # not enough heroes found, restart loop
-                return self.calculate_sleep_time(start_time)
+                return self.finish_tick(start_time, current_view)
 
             if current_view == "Tab":
+                self.capture_objective(screen_img_array)
                 self.map.identify_objective_progress(screen_img_array, current_view=current_view)
-                self.gameTime.main(screen_img_array, current_time_string)
+                with Instrumentation.span("time"):
+                    self.gameTime.main(screen_img_array, current_time_string)
 
         elif self.game_over is False:
+            self.capture_objective(screen_img_array)
             self.map.identify_objective_progress(screen_img_array)
 
         # game stats tracking
@@ -80,22 +104,67 @@ class Game:
         #                                      self.map.currentMapSide, copy.deepcopy(self.map.get_objective_progress()),
         #                                      self.gameTime.get_verified_game_time(current_time), current_time)
 
-        return self.calculate_sleep_time(start_time)
+        return self.finish_tick(start_time, current_view)
 
-    def get_screen(self):
-        screen_img = ImageGrab.grab(bbox=self.bbox)
-        return np.asarray(screen_img)
+    def finish_tick(self, start_time, current_view):
+        """ Records how long the tick took and determines the sleep time before the next one
 
-    @staticmethod
-    def calculate_sleep_time(start_time):
-        """Determine sleep time, at least 0.5 seconds to reduce app's overall cpu usage
-
-        :param start_time: Time object of when this loop started
+        :param start_time: Time object of when this tick started
+        :param current_view: String of the current view, or False
         :return: Float of the time to sleep in seconds
         """
-        time_difference = time.time() - start_time
-        if time_difference < 0.5:
-            sleep_time = 0.5 - time_difference
+        Instrumentation.record("tick", time.time() - start_time)
+        return self.scheduler.next_sleep_time(start_time, self.tick_pace(current_view))
+
+    def get_screen(self, regions=None):
+        """ Captures the screen
+
+        :param regions: List of dimensions dictionaries to capture, None for the full screen
+        :return: Numpy array of the screen shot
+        """
+        return self.capture.grab(regions)
+
+    def capture_regions(self):
+        """ Lists the regions of the screen the analysers read this tick
+
+        :return: List of dimensions dictionaries, None for the full screen
+        """
+        if self.debugMode:
+            return None  # debug data includes full screen shots
+
+        regions = self.map.capture_regions() + self.heroes.capture_regions() + self.gameTime.capture_regions()
+        self.objective_captured = self.map.objective_in_progress()
+        if self.objective_captured:
+            regions = regions + self.map.objective_capture_regions()
+        return regions
+
+    def capture_objective(self, screen_img_array):
+        """ Captures the objective's regions into the screen shot if they were not captured with it,
+        e.g. when the map was identified this tick
+
+        :param screen_img_array: Numpy array of the screen shot
+        :return: None
+        """
+        if not self.debugMode and not self.objective_captured:
+            self.capture.grab(self.map.objective_capture_regions(), screen_img_array)
+            self.objective_captured = True
+
+    def tick_pace(self, current_view):
+        """Determine how fast the next tick should come: fast during Hero Select or while the objective changes,
+        idle when there is neither a view nor an objective being tracked (no map yet, or the game ended)
+
+        :param current_view: String of the current view, or False
+        :return: String of the pace for the scheduler: "fast", "normal" or "idle"
+        """
+        objective_progress = None
+        if "gameOver" in self.map.objectiveProgress:
+            objective_progress = self.map.get_objective_progress()
+        objective_changed = objective_progress != self.previous_objective_progress
+        self.previous_objective_progress = objective_progress
+
+        if current_view == "Hero Select" or objective_changed or self.map.objective_contested():
+            return "fast"
+        elif current_view or self.map.objective_in_progress():
+            return "normal"
         else:
-            sleep_time = 0
-        return sleep_time
+            return "idle"
@@ -1,13 +1,45 @@
-from functools import reduce
 from collections import Counter
 import re
 import numpy as np
 from PIL import Image
 
+from ReferenceImages import ReferenceImages, ReferenceView
+from ReferencePack import ReferencePack
+from ReferenceRegistry import ReferenceRegistry
+
 
 class GameObject:
+    # mean absolute difference (0-255) allowed between a crop and the previously analysed crop to reuse its result
+    unchangedTolerance = 1.0
+    # "exhaustive" scores every reference, "cascade" drops references that cannot reach the threshold early,
+    # "verify" runs both and reports when they would identify differently
+    matcher = "exhaustive"
+    # remove_dark_background never keeps a pixel at or below this brightness (0-255)
+    darkBackgroundCutOff = 200
+
     @staticmethod
     def read_references(filename):
+        """ Returns a reference list shared by every GameObject, loading it the first time it is requested
+
+        :param filename: String of the reference list's text filename
+        :return: ReferenceImages of the reference list
+        """
+        return ReferenceRegistry.get(filename, GameObject.load_references)
+
+    @staticmethod
+    def load_references(filename):
+        """ Loads a reference list from the compiled reference pack, or from its text file if the pack is stale
+
+        :param filename: String of the reference list's text filename
+        :return: ReferenceImages of the reference list
+        """
+        reference_images = ReferencePack.load(filename)
+        if reference_images is None:
+            reference_images = GameObject.parse_references(filename)
+        return reference_images
+
+    @staticmethod
+    def parse_references(filename):
         regex = re.compile('\d+')
         reference_image_file = open(filename, 'r').read()
         reference_image_file = reference_image_file.split('\n')
@@ -25,7 +57,23 @@ class GameObject:
                     for pixel in pixel_list:
                         final_pixel_list.append(int(pixel))
                     reference_image_dictionary[image_string[0]][-1] = final_pixel_list
-        return reference_image_dictionary
+        return ReferenceImages(
+            {name: np.array(image, dtype=np.uint8) for name, image in reference_image_dictionary.items()})
+
+    def image_unchanged(self, previous_image_array, image_array):
+        """ Checks if a crop is the same as the previously analysed crop, so its result can be reused.
+        Crops that are not byte-identical are compared downsampled against unchangedTolerance
+
+        :param previous_image_array: Numpy Array of the previously analysed crop, or None
+        :param image_array: Numpy Array of the crop to analyse
+        :return: Boolean if the crop is unchanged
+        """
+        if previous_image_array is None or previous_image_array.shape != image_array.shape:
+            return False
+        if np.array_equal(previous_image_array, image_array):
+            return True
+        difference = np.abs(previous_image_array[::2, ::2].astype(np.int16) - image_array[::2, ::2])
+        return difference.mean() <= self.unchangedTolerance
 
     def threshold(self, image_array, respawn_filter=False):
         """ Turns an image to black and white based on the median brightness
@@ -34,30 +82,65 @@ class GameObject:
         :param respawn_filter: Boolean to apply respawn filter
         :return: Numpy Array of processed image
         """
-        balance = self.get_image_balance(image_array, respawn_filter)
-        new_array = self.image_to_black_and_white(image_array, balance)
-        return new_array
+        return self.mask_to_image(image_array, self.threshold_mask(image_array, respawn_filter))
+
+    def threshold_mask(self, image_array, respawn_filter=False):
+        """ Same as threshold, but returns only which pixels are white
 
-    def get_image_balance(self, image_array, respawn_filter):
+        :param image_array: Numpy Array of image
+        :param respawn_filter: Boolean to apply respawn filter
+        :return: 2D Numpy Array of booleans, True for white pixels
+        """
+        averages = self.channel_sums(image_array) / 3
+        return averages > self.get_image_balance(image_array, respawn_filter, averages)
+
+    @staticmethod
+    def channel_sums(image_array):
+        """ Sums the red, green and blue values of every pixel
+
+        :param image_array: Numpy Array of image
+        :return: 2D Numpy Array of integers (0-765)
+        """
+        return np.asarray(image_array)[:, :, :3].sum(axis=2, dtype=np.int64)
+
+    def respawn_mask(self, shape):
+        """ Marks the pixels the respawn filter keeps
+
+        :param shape: Tuple of the image's height and width
+        :return: 2D Numpy Array of booleans
+        """
+        return np.asarray(self.respawnFilter["respawn-filter"])[:shape[0], :shape[1]] != 0
+
+    def get_image_balance(self, image_array, respawn_filter, averages=None):
         """ Calculates the median brightness of an image
 
         :param image_array: Numpy Array of image
         :param respawn_filter: Boolean to apply respawn filter
+        :param averages: 2D Numpy Array of the image's channel_sums divided by 3, if already calculated
         :return: Float of median brightness (0-255)
         """
-        balance_array = []
-        apply_respawn_filter = hasattr(self, 'respawnFilter') and respawn_filter
+        if averages is None:
+            averages = self.channel_sums(image_array) / 3
+        if hasattr(self, 'respawnFilter') and respawn_filter:
+            averages = averages[self.respawn_mask(averages.shape)]
+        else:
+            averages = averages.ravel()
 
-        for row_number, each_row in enumerate(image_array):
-            for pixel_number, each_pixel in enumerate(each_row):
-                if apply_respawn_filter:
-                    if self.respawnFilter["respawn-filter"][row_number][pixel_number] == 0:
-                        continue
-                avg_num = reduce(lambda x, y: int(x) + int(y), each_pixel[:3]) / 3
-                balance_array.append(avg_num)
+        # added up one pixel after another (not pairwise like np.sum), so the balance and therefore the
+        # references stay bit for bit the same as when they were created
+        return float(np.cumsum(averages)[-1]) / averages.size
 
-        balance = reduce(lambda x, y: x + y, balance_array) / len(balance_array)
-        return balance
+    @staticmethod
+    def mask_to_image(image_array, mask):
+        """ Turns a mask of white pixels into a black and white copy of the image
+
+        :param image_array: Numpy Array of image
+        :param mask: 2D Numpy Array of booleans, True for white pixels
+        :return: Numpy Array of black and white image
+        """
+        new_array = np.zeros_like(image_array)
+        new_array[mask] = 255  # White
+        return new_array
 
     @staticmethod
     def image_to_black_and_white(image_array, cut_off):
@@ -67,15 +150,7 @@ class GameObject:
         :param cut_off: Float of median brightness (0-255)
         :return: Numpy Array of black and white image
         """
-        new_array = image_array.copy()
-        new_array.setflags(write=1)
-        for row_number, each_row in enumerate(new_array):
-            for pixel_number, each_pixel in enumerate(each_row):
-                if reduce(lambda x, y: int(x) + int(y), each_pixel[:3]) / 3 > cut_off:
-                    new_array[row_number][pixel_number] = [255, 255, 255]  # White
-                else:
-                    new_array[row_number][pixel_number] = [0, 0, 0]  # Black
-        return new_array
+        return GameObject.mask_to_image(image_array, GameObject.channel_sums(image_array) / 3 > cut_off)
 
     def remove_dark_background(self, image_array):
         """  Changes values below the cut_off to black, keeping other values intact
@@ -84,58 +159,60 @@ class GameObject:
         :return: Numpy Array of black and white image
         """
 
-        cut_off = self.get_image_balance(image_array, False)
-        if cut_off < 200:
-            cut_off = 200
-        new_array = image_array.copy()
-        new_array.setflags(write=1)
-        for row_number, each_row in enumerate(new_array):
-            for pixel_number, each_pixel in enumerate(each_row):
-                if reduce(lambda x, y: int(x) + int(y), each_pixel[:3]) / 3 > cut_off:
-                    new_array[row_number][pixel_number] = image_array[row_number][pixel_number]
-                else:
-                    new_array[row_number][pixel_number] = [0, 0, 0]  # Black
+        image_array = np.asarray(image_array)
+        averages = self.channel_sums(image_array) / 3
+        cut_off = self.get_image_balance(image_array, False, averages)
+        if cut_off < self.darkBackgroundCutOff:
+            cut_off = self.darkBackgroundCutOff
+        mask = averages > cut_off
+        new_array = np.zeros_like(image_array)
+        new_array[mask] = image_array[mask]
         return new_array
 
-    def what_image_is_this(self, captured_image, reference_images_dictionary, respawn_filter=False):
+    def what_image_is_this(self, captured_image, reference_images_dictionary, respawn_filter=False, threshold=None):
         """ Compares the captured image to the saved reference images and ranks how similar they are
 
         :param captured_image: Numpy Array of image in question
-        :param reference_images_dictionary: Dictionary of images (lists) to compare to
+        :param reference_images_dictionary: Dictionary of images (lists) or ReferenceView to compare to
         :param respawn_filter: Boolean to apply respawn_filter
+        :param threshold: Float (0 - 1) of the score needed to identify the image, lets the cascade matcher leave out
+            references that cannot reach it. None to score every reference
         :return: Dictionary of the scores of the comparisons (0 - 1)
         """
-        matched_array = []
-        captured_image_list = captured_image.tolist()
-        total = {}
+        if not isinstance(reference_images_dictionary, (ReferenceImages, ReferenceView)):
+            reference_images_dictionary = ReferenceImages(reference_images_dictionary)
+
+        pixel_filter = None
+        if hasattr(self, 'respawnFilter') and respawn_filter:
+            # filter out these pixels, they could be red or white and will be covering the hero
+            pixel_filter = self.respawnFilter["respawn-filter"]
+
+        if threshold is None or self.matcher == "exhaustive":
+            return reference_images_dictionary.ratios(captured_image, pixel_filter)
+
+        potential = reference_images_dictionary.cascade_ratios(captured_image, threshold, pixel_filter)
+        if self.matcher == "verify":
+            exhaustive_potential = reference_images_dictionary.ratios(captured_image, pixel_filter)
+            if self.identified_image(potential, threshold) != self.identified_image(exhaustive_potential, threshold):
+                print("Cascade matcher identified " + str(self.identified_image(potential, threshold)) +
+                      " instead of " + str(self.identified_image(exhaustive_potential, threshold)))
+            return exhaustive_potential
+        return potential
 
-        apply_respawn_filter = hasattr(self, 'respawnFilter') and respawn_filter
+    @staticmethod
+    def identified_image(potential, threshold):
+        """ Picks the image a potential identifies
 
-        for item_name, reference_image in reference_images_dictionary.items():
-            total[item_name] = 0
-            row = 0
-            for reference_row in reference_image:  # captured_image must not be larger than any reference image
-                pixel = 0
-                for reference_pixel in reference_row:
-                    skip = False
-                    # print("Reference Pixel: " + str(reference_pixel) +
-                    #     " Captured Pixel: " + str(captured_image_list[row][pixel][0]))
-                    if apply_respawn_filter:  # apply filter when respawning
-                        if self.respawnFilter["respawn-filter"][row][pixel] == 0:
-                            # filter out this pixel, it could be red or white and will be covering the hero
-                            skip = True
-                    if not skip:
-                        total[item_name] += 1
-                        if reference_pixel == captured_image_list[row][pixel][0]:
-                            matched_array.append(item_name)
-                    pixel = pixel + 1
-                row = row + 1
-        counter = Counter(matched_array)
-        most_common = counter.most_common()
-        ratios = {}
-        for item in most_common:
-            ratios[item[0]] = item[1] / total[item[0]]
-        return ratios
+        :param potential: Dictionary of the scores of the comparisons (0 - 1)
+        :param threshold: Float (0 - 1) of the score needed to identify the image
+        :return: String of the identified image's name, or None
+        """
+        if len(potential) == 0:
+            return None
+        identified = max(potential.keys(), key=(lambda k: potential[k]))
+        if potential[identified] > threshold:
+            return identified
+        return None
 
     def what_word_is_this(self, captured_image, encoded_reference_images_dictionary, letter_string="", loop_count=0):
         """ Work in Progress
@@ -25,6 +25,7 @@ class Hero:
         self.calculate_screen_position()
 
         self.hero_changed = False
+        self.identifiedView = None  # view currentImageArray was identified in
 
     def calculate_screen_position(self):
         """ Calculates this hero's positions in a view when identifying
@@ -82,6 +83,18 @@ class Hero:
         self.previousHero = self.currentHero
         self.currentHero = hero
         self.hero_changed = True
+        self.identifiedView = None
+
+    def copy_identification(self, identified_hero):
+        # only what identifying a (worker process's copy of the) hero changes
+        self.currentHero = identified_hero.currentHero
+        self.previousHero = identified_hero.previousHero
+        self.currentImageArray = identified_hero.currentImageArray
+        self.previousImageArray = identified_hero.previousImageArray
+        self.potential = identified_hero.potential
+        self.previousPotential = identified_hero.previousPotential
+        self.hero_changed = identified_hero.hero_changed
+        self.identifiedView = identified_hero.identifiedView
 
     def revert_previous_hero(self):
         if self.previousHero is not None and self.hero_changed:
@@ -91,6 +104,7 @@ class Hero:
             self.previousPotential = None
             self.currentImageArray = self.previousImageArray
             self.previousImageArray = None
+            self.identifiedView = None
 
     def get_hero_number(self):
         if self.currentHero is None:
@@ -113,3 +127,4 @@ class Hero:
         self.previousHero = None
         self.previousImageArray = None
         self.previousPotential = None
+        self.identifiedView = None
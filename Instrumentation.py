@@ -0,0 +1,157 @@
+from collections import Counter, deque
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class DisabledSpan:
+    """ Does nothing in a with block, returned by Instrumentation.span while instrumentation is disabled
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class Span:
+    """ Times the code inside a with block and records it under the span's name
+    """
+
+    __slots__ = ("name", "startTime")
+
+    def __init__(self, name):
+        self.name = name
+        self.startTime = None
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Instrumentation.record(self.name, time.perf_counter() - self.startTime)
+        return False
+
+
+class Instrumentation:
+    """ Process-wide timing spans and counters for the analysis hot path. Each span keeps its most recent durations
+    in memory, so a summary (percentiles and a histogram) can be printed or exported at any time.
+    Disabled by default, when spans cost little more than a function call.
+    """
+
+    enabled = False
+    window = 500  # most recent durations kept per span
+    histogram_edges = [1, 2, 5, 10, 20, 50, 100, 200, 500]  # ms
+
+    durations = {}  # span name: deque of the most recent durations in seconds
+    span_counts = Counter()
+    counters = Counter()
+    lock = threading.Lock()
+    disabled_span = DisabledSpan()
+
+    @classmethod
+    def span(cls, name):
+        """ Times a with block, e.g. with Instrumentation.span("time"): ...
+
+        :param name: String of the span's name
+        :return: Context manager
+        """
+        if not cls.enabled:
+            return cls.disabled_span
+        return Span(name)
+
+    @classmethod
+    def record(cls, name, duration):
+        """ Records a duration under a span's name
+
+        :param name: String of the span's name
+        :param duration: Float of the duration in seconds
+        :return: None
+        """
+        if not cls.enabled:
+            return
+        with cls.lock:
+            if name not in cls.durations:
+                cls.durations[name] = deque(maxlen=cls.window)
+            cls.durations[name].append(duration)
+            cls.span_counts[name] += 1
+
+    @classmethod
+    def count(cls, name, amount=1):
+        """ Adds to a counter
+
+        :param name: String of the counter's name
+        :param amount: Int to add
+        :return: None
+        """
+        if not cls.enabled:
+            return
+        with cls.lock:
+            cls.counters[name] += amount
+
+    @classmethod
+    def summary(cls):
+        """ Summarises every span's recent durations and every counter
+
+        :return: Dictionary of "spans" (count, window percentiles and histogram in ms) and "counters"
+        """
+        with cls.lock:
+            durations = {name: list(span_durations) for name, span_durations in cls.durations.items()}
+            span_counts = dict(cls.span_counts)
+            counters = dict(cls.counters)
+
+        bucket_names = ["<" + str(edge) + "ms" for edge in cls.histogram_edges]
+        bucket_names.append(">=" + str(cls.histogram_edges[-1]) + "ms")
+        spans = {}
+        for name, span_durations in durations.items():
+            milliseconds = np.array(span_durations) * 1000
+            histogram = np.histogram(milliseconds, bins=[0] + cls.histogram_edges + [np.inf])[0]
+            spans[name] = {
+                "count": span_counts[name],
+                "p50_ms": float(np.percentile(milliseconds, 50)),
+                "p95_ms": float(np.percentile(milliseconds, 95)),
+                "p99_ms": float(np.percentile(milliseconds, 99)),
+                "max_ms": float(milliseconds.max()),
+                "histogram": dict(zip(bucket_names, histogram.tolist()))
+            }
+        return {"spans": spans, "counters": counters}
+
+    @classmethod
+    def dump(cls):
+        """ Prints the summary, slowest spans first
+
+        :return: None
+        """
+        summary = cls.summary()
+        for name, span in sorted(summary["spans"].items(), key=lambda item: item[1]["p95_ms"], reverse=True):
+            print(name + ": " + str(span["count"]) + " calls, p50 " + str(round(span["p50_ms"], 2)) + "ms, p95 " +
+                  str(round(span["p95_ms"], 2)) + "ms, p99 " + str(round(span["p99_ms"], 2)) + "ms, max " +
+                  str(round(span["max_ms"], 2)) + "ms")
+        for name, counter in sorted(summary["counters"].items()):
+            print(name + ": " + str(counter))
+
+    @classmethod
+    def export(cls, filename):
+        """ Writes the summary to a JSON file
+
+        :param filename: String of the file to write
+        :return: None
+        """
+        with open(filename, "w") as export_file:
+            json.dump(cls.summary(), export_file, indent=4)
+
+    @classmethod
+    def reset(cls):
+        """ Forgets every recorded duration and counter
+
+        :return: None
+        """
+        with cls.lock:
+            cls.durations = {}
+            cls.span_counts = Counter()
+            cls.counters = Counter()
@@ -1,16 +1,27 @@
-from PIL import Image, ImageFilter, ImageOps
+from collections import deque
+
+from PIL import Image
 import numpy as np
-from scipy.misc import imresize
 import operator
 import copy
 
 from MapState import MapState
+from ReferenceRegistry import LazyReferences
+from Instrumentation import Instrumentation
 
 from GameObject import GameObject
+from Resampler import Resampler
 
 
 class MapInfo(GameObject):
 
+    team_sides = np.array(["neither", "offense", "defense"])  # indexed by team label
+    opposite_team_labels = np.array([0, 2, 1])
+    team_lookup_shift = 0  # bits dropped from each channel to label pixels from a lookup table, 0 to compare exactly
+    team_lookups = {}  # (colors, shift): labels of every quantized color
+    escort_window = 4  # escort progress readings that must agree before the objective counts as unlocked
+    escort_subpixel = False  # estimate the escort progress to tenths of a percent from the edge pixel's color
+
     def __init__(self, game_version, debug_mode):
         self.game_version = game_version
         self.debugMode = debug_mode
@@ -34,17 +45,18 @@ class MapInfo(GameObject):
             "necropolis": "arena", "nepal sanctum": "arena", "nepal shrine": "arena", "nepal village": "arena",
             "oasis city center": "arena", "oasis gardens": "arena", "oasis university": "arena", "petra": "arena",
         }
-        self.mapReferences = {
-            "Hero Select Assault": self.read_references("Reference\\MapImageListAssault.txt"),
-            "Hero Select Control": self.read_references("Reference\\MapImageListControl.txt"),
-            "Hero Select Escort": self.read_references("Reference\\MapImageListEscort.txt"),
-            "Hero Select Hybrid": self.read_references("Reference\\MapImageListHybrid.txt"),
-            "Hero Select Arena": self.read_references("Reference\\MapImageListArena.txt"),
-            "Tab": self.read_references("Reference\\MapImageListTab.txt"),
-            # "High Threshold": self.read_references("Reference\\MapImageHighThreshold.txt"),
-            "Game Type": self.read_references("Reference\\MapImageListGameType.txt"),
-            "Letters": self.read_references("Reference\\Letters.txt"),
-        }
+        # each map reference list is only loaded the first time its view or game type is seen
+        self.mapReferences = LazyReferences({
+            "Hero Select Assault": "Reference\\MapImageListAssault.txt",
+            "Hero Select Control": "Reference\\MapImageListControl.txt",
+            "Hero Select Escort": "Reference\\MapImageListEscort.txt",
+            "Hero Select Hybrid": "Reference\\MapImageListHybrid.txt",
+            "Hero Select Arena": "Reference\\MapImageListArena.txt",
+            "Tab": "Reference\\MapImageListTab.txt",
+            # "High Threshold": "Reference\\MapImageHighThreshold.txt",
+            "Game Type": "Reference\\MapImageListGameType.txt",
+            "Letters": "Reference\\Letters.txt",
+        }, self.read_references)
         self.assaultReference = self.read_references("Reference\\ObjectiveListAssault.txt")
         self.controlReference = self.read_references("Reference\\ObjectiveListControl.txt")
         full_digit_references = self.read_references("Reference\\DigitImageList.txt")
@@ -76,6 +88,8 @@ class MapInfo(GameObject):
         self.thisMapPotential = None
         self.previousImageArray = None
         self.previousPotential = None
+        self.analysedMaps = {}  # (view, section, game mode): (crop, processed crop, potential)
+        self.darkMaps = {}  # (view, section, game mode): (processed crop, potential) of crops without bright pixels
 
         self.game_mode = None
         self.previous_game_mode = None
@@ -83,19 +97,19 @@ class MapInfo(GameObject):
         self.competitive = True
         self.competitive_confirmed = False
         self.check_competitive = True
+        self.competitive_scan = None  # result of identify_competitive until the map or side changes
 
         self.objectiveProgress = {}
         self.assaultPixelsToCheck = []
 
-        self.letters_rle = {}
-        for letter, image in self.mapReferences["Letters"].items():
-            self.letters_rle[letter] = self.run_length_encode(image)
+        self.lettersRle = None
 
         self.dimensions = self.dimensions_from_version()
         self.calculate_assault_progress_pixels()
 
     def main(self, screen_image_array, current_time):
-        """Process the saved screen shot to see what the current view is (either "Tab" or "Hero Select")
+        """Process the saved screen shot to see what the current view is (either "Tab" or "Hero Select").
+        Hero Select sections without any bright pixel are not processed again, see analyse_map
 
         :param: screen_image_array: Numpy array of the screen shot
         :param: current_time: String of the current time
@@ -124,6 +138,7 @@ class MapInfo(GameObject):
         self.competitive = True
         self.competitive_confirmed = False
         self.check_competitive = True
+        self.competitive_scan = None
 
         self.objectiveProgress = {
             "currentType": None,
@@ -139,11 +154,13 @@ class MapInfo(GameObject):
         if map_type == "control":
             self.objectiveProgress["controlProgress"] = [None, None, None, None]
         if map_type == "escort" or map_type == "transition":
-            self.objectiveProgress["escortProgress"] = []
+            # only the readings before the newest one are kept, as the list of 3 it used to be
+            self.objectiveProgress["escortProgress"] = deque(maxlen=self.escort_window - 1)
 
     def calculate_assault_progress_pixels(self):
         """ Progress on each assault point is displayed with a radial bar that fills as the team captures the point.
-        This calculates the pixels to check based on each point's center.
+        This calculates the pixels to check based on each point's center, as index arrays of the y and x coordinates
+        so the 100 pixels of a point can be read at once.
 
         :return: None
         """
@@ -167,7 +184,8 @@ class MapInfo(GameObject):
                 point_number = 0
                 self.assaultPixelsToCheck[map_type][mode] = []
                 for centerPoint in center_points:
-                    self.assaultPixelsToCheck[map_type][mode].append([])
+                    x_coordinates = []
+                    y_coordinates = []
                     for percentage in range(1, 101):
                         # theta = -(percentage - 125) / (5 / 18) # complete circle; it is segmented as of patch 1.17
                         if 1 <= percentage <= 33:
@@ -184,9 +202,89 @@ class MapInfo(GameObject):
                         if 25 < percentage < 75:  # center isn't perfectly center
                             y_coordinate = y_coordinate + 1
                         # print(str(percentage) + " " + str(theta) + " " + str(x_coordinate) + " " + str(y_coordinate))
-                        self.assaultPixelsToCheck[map_type][mode][point_number].append([x_coordinate, y_coordinate])
+                        x_coordinates.append(x_coordinate)
+                        y_coordinates.append(y_coordinate)
+                    self.assaultPixelsToCheck[map_type][mode].append((np.array(y_coordinates), np.array(x_coordinates)))
                     point_number = point_number + 1
 
+    @property
+    def letters_rle(self):
+        """ Run length encoded letter references, encoded the first time they are used
+
+        :return: Dictionary of encoded letters
+        """
+        if self.lettersRle is None:
+            self.lettersRle = {}
+            for letter, image in self.mapReferences["Letters"].items():
+                self.lettersRle[letter] = self.run_length_encode(image)
+        return self.lettersRle
+
+    def capture_regions(self):
+        """ Lists the regions of the screen read when identifying the map, view and side
+
+        :return: List of dimensions dictionaries
+        """
+        regions = self.dimension_regions(self.dimensions["map"])
+        regions.append({"start_x": 95, "end_x": 96, "start_y": 79, "end_y": 80})  # identify_side
+        return regions
+
+    def objective_capture_regions(self):
+        """ Lists the regions of the screen read when identifying the objective progress or game end
+
+        :return: List of dimensions dictionaries
+        """
+        regions = []
+        for dimensions_name, dimensions in self.dimensions.items():
+            if dimensions_name != "map":
+                regions = regions + self.dimension_regions(dimensions)
+        # pixels checked by identify_control_core
+        regions.append({"start_x": 774, "end_x": 1147, "start_y": 91, "end_y": 164})
+        # assault progress circles
+        for map_type, modes in self.assaultPixelsToCheck.items():
+            for mode, points in modes.items():
+                for y_coordinates, x_coordinates in points:
+                    regions.append({
+                        "start_x": int(x_coordinates.min()), "end_x": int(x_coordinates.max()) + 1,
+                        "start_y": int(y_coordinates.min()), "end_y": int(y_coordinates.max()) + 1
+                    })
+        return regions
+
+    def objective_in_progress(self):
+        """ Returns if the objective of an identified map is being tracked
+
+        :return: Boolean
+        """
+        return self.current_map != [None] and self.objectiveProgress.get("gameOver") is False
+
+    def objective_contested(self):
+        """ Returns if an unlocked control point is not held by either team, or is in overtime
+
+        :return: Boolean
+        """
+        control_progress = self.objectiveProgress.get("controlProgress")
+        if control_progress is None or control_progress[0] is None:
+            return False
+        if control_progress[0].startswith("Locked") or control_progress[0].startswith("Prepare"):
+            return False
+        return control_progress[3] == "neither" or control_progress[0].endswith("-Overtime")
+
+    @staticmethod
+    def dimension_regions(dimensions):
+        """ Collects every region of a (nested) dimensions dictionary
+
+        :param dimensions: Dictionary of dimensions, or of dictionaries of dimensions
+        :return: List of dimensions dictionaries
+        """
+        if "start_x" in dimensions:
+            if "y" in dimensions:  # single row
+                return [{"start_x": dimensions["start_x"], "end_x": dimensions["end_x"],
+                         "start_y": dimensions["y"], "end_y": dimensions["y"] + 1}]
+            return [dimensions]
+        regions = []
+        for sub_dimensions in dimensions.values():
+            regions = regions + MapInfo.dimension_regions(sub_dimensions)
+        return regions
+
     def map_type(self):
         """ Returns the current map type, defaulting to assault
 
@@ -209,14 +307,13 @@ class MapInfo(GameObject):
         section = "normal"
 
         if view == "Hero Select":
-            game_mode_identified = self.identify_game_type(screen_img_array, view)
+            with Instrumentation.span("game type"):
+                game_mode_identified = self.identify_game_type(screen_img_array, view)
             if game_mode_identified:
                 # The game mode is an icon to the left of the map's name, causing that name to be pushed to the right
                 section = "extended"
 
-        this_map_array = self.get_map(screen_img_array, view, section=section)
-        map_reference = self.what_map_reference(view, section)
-        potential = self.what_image_is_this(this_map_array, map_reference)
+        this_map_array, potential = self.analyse_map(screen_img_array, view, section)
         this_map = max(potential.keys(), key=(lambda k: potential[k]))
 
         self.previousImageArray = self.currentImageArray
@@ -267,10 +364,9 @@ class MapInfo(GameObject):
         :param view: String of view to check
         :return: Boolean if game type is identified
         """
-        this_mode_array = self.get_map(screen_img_array, view, section='game_type')
+        this_mode_array, potential = self.analyse_map(screen_img_array, view, 'game_type')
         # img = Image.fromarray(this_mode_array)
         # img.save("Debug\\Game Mode.png", "PNG")
-        potential = self.what_image_is_this(this_mode_array, self.mapReferences['Game Type'])
         this_game_mode = max(potential.keys(), key=(lambda k: potential[k]))
         if potential[this_game_mode] > self.imageThreshold["Game Type"]:
             self.previous_game_mode = self.game_mode
@@ -282,6 +378,42 @@ class MapInfo(GameObject):
         else:
             return False
 
+    def analyse_map(self, screen_img_array, view, section):
+        """ Processes a section of the screen shot and compares it to its map references.
+        If the section has not changed since it was last analysed, the previous result is reused.
+        A Hero Select section without any pixel above darkBackgroundCutOff has all of its pixels removed by
+        remove_dark_background, so it processes into the same image as any other dark section; it is only processed
+        and matched the first time
+
+        :param screen_img_array: Numpy array of the screen shot
+        :param view: String of view to check
+        :param section: String of the specific section of the screen shot
+        :return: Tuple of the processed section (Numpy array) and its potential (Dictionary)
+        """
+        if section == 'game_type':
+            map_reference = self.mapReferences['Game Type']
+            analysed_key = (view, section, None)
+        else:
+            map_reference = self.what_map_reference(view, section)
+            analysed_key = (view, section, self.game_mode if section == "extended" else None)
+
+        map_image_array = self.cut_image(screen_img_array, self.dimensions['map'][view][section])
+        if view == "Hero Select" and map_image_array.max() <= self.darkBackgroundCutOff:
+            if analysed_key not in self.darkMaps:
+                this_map_array = self.get_map(screen_img_array, view, section=section)
+                self.darkMaps[analysed_key] = (this_map_array, self.what_image_is_this(this_map_array, map_reference))
+            Instrumentation.count("dark " + section)
+            return self.darkMaps[analysed_key]
+
+        analysed = self.analysedMaps.get(analysed_key)
+        if analysed is not None and self.image_unchanged(analysed[0], map_image_array):
+            return analysed[1], analysed[2]
+
+        this_map_array = self.get_map(screen_img_array, view, section=section)
+        potential = self.what_image_is_this(this_map_array, map_reference)
+        self.analysedMaps[analysed_key] = (map_image_array.copy(), this_map_array, potential)
+        return this_map_array, potential
+
     def what_map_reference(self, view, section):
         """ Returns a portion of the maps to check
 
@@ -353,7 +485,7 @@ class MapInfo(GameObject):
                 # img = Image.fromarray(map_image_array)
                 # img.save("Debug\\Full Original Map.png", "PNG")
                 processed_image_array = self.process_image(map_image_array, filter_enabled=True)
-                scaled_image_array = imresize(processed_image_array, (19, 180))
+                scaled_image_array = Resampler.resize(processed_image_array, (180, 19))
             else:
                 scaled_image_array = self.process_image(map_image_array, filter_enabled=True)
         elif view == "Tab":
@@ -389,26 +521,34 @@ class MapInfo(GameObject):
 
         if filter_enabled:
             map_filtered_background = self.remove_dark_background(map_image_array)
-            map_image = Image.fromarray(map_filtered_background)
-            map_image.save("Debug\\Temp Map.png", "PNG")
-            contoured_image = map_image.filter(ImageFilter.CONTOUR)  # .filter(ImageFilter.SMOOTH_MORE)
-            inverted_image = ImageOps.invert(contoured_image)
-
-            img_array = np.asarray(inverted_image)
-            img_array.setflags(write=True)
-            for row_number, row in enumerate(img_array):
-                for column_number, column in enumerate(row):
-                    first_four_rows = list(range(0, 4))
-                    last_four_rows = list(range(len(img_array) - 4, len(img_array)))
-                    if row_number in first_four_rows or row_number in last_four_rows:
-                        img_array[row_number][column_number] = [0, 0, 0]
-                    elif column_number == 0 or column_number == len(column):
-                        img_array[row_number][column_number] = [0, 0, 0]
+            img_array = self.inverted_contour(map_filtered_background)
+
+            img_array[:4] = 0  # first four rows
+            img_array[-4:] = 0  # last four rows
+            img_array[:, 0] = 0
+            # the references were created blacking out the column numbered like the pixel's channel count
+            img_array[:, img_array.shape[2]:img_array.shape[2] + 1] = 0
         else:
             img_array = map_image_array
 
         return img_array
 
+    @staticmethod
+    def inverted_contour(image_array):
+        """ Same as inverting PIL's ImageFilter.CONTOUR: the sum of the 8 neighbours minus 8 times the pixel, per
+        channel and clipped to 0-255. Like PIL, the outermost pixels are not filtered, so they are only inverted
+
+        :param image_array: Numpy Array of image
+        :return: Numpy Array of the edges, white on black
+        """
+        pixels = image_array.astype(np.int16)
+        edges = 255 - pixels
+        neighbours = (pixels[:-2, :-2] + pixels[:-2, 1:-1] + pixels[:-2, 2:] +
+                      pixels[1:-1, :-2] + pixels[1:-1, 2:] +
+                      pixels[2:, :-2] + pixels[2:, 1:-1] + pixels[2:, 2:])
+        edges[1:-1, 1:-1] = np.clip(neighbours - 8 * pixels[1:-1, 1:-1], 0, 255)
+        return edges.astype(np.uint8)
+
     def identify_side(self, img_array):
         """ Processes the image to identifies your team's side
 
@@ -429,69 +569,28 @@ class MapInfo(GameObject):
         else:
             return False
 
-    @staticmethod
-    def team_from_pixel(pixel_to_check, opposite=False):
+    @classmethod
+    def team_from_pixel(cls, pixel_to_check, opposite=False):
         """ Identifies a team's side based on the color at a specific pixel
 
         :param pixel_to_check: Array of the pixel to check
         :param opposite: Boolean to switch the results
         :return: String of side identified
         """
+        return str(cls.teams_from_pixels(np.asarray(pixel_to_check)[np.newaxis], "standard", opposite)[0])
 
-        red = pixel_to_check[0]
-        green = pixel_to_check[1]
-        blue = pixel_to_check[2]
-
-        if (red > 195) and (green < 200) and (blue < 200):  # red
-            this_side = "offense"
-        elif (red < 200) and (green > 170) and (blue > 100):  # blue
-            this_side = "defense"
-        else:
-            this_side = "neither"
-            # print("Neither")
-            # print("rgb: " + str(red) + "," + str(green) + "," + str(blue))
-        if opposite:
-            switcher = {
-                "offense": "defense",
-                "defense": "offense",
-                "neither": "neither"
-            }
-            this_side = switcher[this_side]
-        return this_side
-
-    @staticmethod
-    def team_from_pixel_assault_circle(pixel_to_check, opposite=False):
+    @classmethod
+    def team_from_pixel_assault_circle(cls, pixel_to_check, opposite=False):
         """ Identifies a team's side based on the color at a specific pixel in the objective icon
 
         :param pixel_to_check: Array of the pixel to check
         :param opposite: Boolean to switch the results
         :return: String of side identified
         """
-        red = pixel_to_check[0]
-        green = pixel_to_check[1]
-        blue = pixel_to_check[2]
-
-        if red > 245 and green < 230 and blue < 240:
-            this_side = "offense"
-        elif (blue > 230 and green > 170 and red < 205 and int(green) - int(red) > 40) or \
-                (red >= 245 and green >= 250 and blue >= 250):
-            # blue/teal or white
-            this_side = "defense"
-        else:
-            this_side = "neither"
-            # print("Neither")
-            # print("rgb: " + str(red) + "," + str(green) + "," + str(blue))
-        if opposite:
-            switcher = {
-                "offense": "defense",
-                "defense": "offense",
-                "neither": "neither"
-            }
-            this_side = switcher[this_side]
-        return this_side
+        return str(cls.teams_from_pixels(np.asarray(pixel_to_check)[np.newaxis], "assault_circle", opposite)[0])
 
-    @staticmethod
-    def team_from_pixel_precise(pixel_to_check, opposite=False):
+    @classmethod
+    def team_from_pixel_precise(cls, pixel_to_check, opposite=False):
         """ Identifies a team's side based on the color at a specific pixel.
         This function also checks ranges between colors
 
@@ -499,29 +598,71 @@ class MapInfo(GameObject):
         :param opposite: Boolean to switch the results
         :return: String of side identified
         """
-        red = pixel_to_check[0]
-        green = pixel_to_check[1]
-        blue = pixel_to_check[2]
-        # print(red)
-        # print(green)
-        # print(blue)
-        if (175 <= red <= 255) and (0 <= green <= 200) and (0 <= blue <= 200) \
-                and (int(red) - int(blue) > 10) and (int(red) - int(green) > 10):
-            this_side = "offense"
-        elif (38 <= red <= 215) and (140 <= green <= 255) and (175 <= blue <= 255) and (int(blue) - int(red) > 10):
-            this_side = "defense"
+        return str(cls.teams_from_pixels(np.asarray(pixel_to_check)[np.newaxis], "precise", opposite)[0])
+
+    @classmethod
+    def teams_from_pixels(cls, pixels_to_check, colors="standard", opposite=False):
+        """ Identifies the team's side of every pixel of a strip or set of pixels at once
+
+        :param pixels_to_check: Numpy Array of pixels, e.g. a row (width, 3) or gathered points (n, 3)
+        :param colors: String of the color ranges to use: "standard", "assault_circle" or "precise"
+        :param opposite: Boolean to switch the results
+        :return: Numpy Array of Strings of the sides identified, one per pixel
+        """
+        pixels = np.asarray(pixels_to_check)[..., :3]
+        if cls.team_lookup_shift:
+            labels = cls.team_lookup(colors)[tuple(np.moveaxis(pixels >> cls.team_lookup_shift, -1, 0))]
         else:
-            this_side = "neither"
-            # print("Neither")
-            # print("rgb: " + str(red) + "," + str(green) + "," + str(blue))
+            labels = cls.team_labels(pixels, colors)
         if opposite:
-            switcher = {
-                "offense": "defense",
-                "defense": "offense",
-                "neither": "neither"
-            }
-            this_side = switcher[this_side]
-        return this_side
+            labels = cls.opposite_team_labels[labels]
+        return cls.team_sides[labels]
+
+    @staticmethod
+    def team_labels(pixels, colors):
+        """ Labels pixels as 0 for neither, 1 for offense (red) and 2 for defense (blue)
+
+        :param pixels: Numpy Array of pixels (..., 3)
+        :param colors: String of the color ranges to use: "standard", "assault_circle" or "precise"
+        :return: Numpy Array of Int labels
+        """
+        pixels = pixels.astype(np.int16)
+        red = pixels[..., 0]
+        green = pixels[..., 1]
+        blue = pixels[..., 2]
+
+        if colors == "standard":
+            offense = (red > 195) & (green < 200) & (blue < 200)
+            defense = (red < 200) & (green > 170) & (blue > 100)
+        elif colors == "assault_circle":
+            offense = (red > 245) & (green < 230) & (blue < 240)
+            # blue/teal or white
+            defense = ((blue > 230) & (green > 170) & (red < 205) & (green - red > 40)) | \
+                      ((red >= 245) & (green >= 250) & (blue >= 250))
+        elif colors == "precise":
+            offense = (red >= 175) & (green <= 200) & (blue <= 200) & (red - blue > 10) & (red - green > 10)
+            defense = (red >= 38) & (red <= 215) & (green >= 140) & (blue >= 175) & (blue - red > 10)
+        else:
+            raise ValueError("Unknown team colors: " + str(colors))
+        # a pixel in both ranges is offense, as it is checked first
+        return np.where(offense, 1, np.where(defense, 2, 0)).astype(np.uint8)
+
+    @classmethod
+    def team_lookup(cls, colors):
+        """ Returns the labels of every quantized color, calculating them the first time they are used.
+        Each bucket is labelled by its middle color, so pixels near the edge of a color range can be labelled
+        differently than by team_labels
+
+        :param colors: String of the color ranges to use
+        :return: Numpy Array of Int labels indexed by the quantized red, green and blue
+        """
+        key = (colors, cls.team_lookup_shift)
+        if key not in cls.team_lookups:
+            bucket_size = 1 << cls.team_lookup_shift
+            middles = np.arange(0, 256, bucket_size) + bucket_size // 2
+            grid = np.stack(np.meshgrid(middles, middles, middles, indexing="ij"), axis=-1)
+            cls.team_lookups[key] = cls.team_labels(grid, colors)
+        return cls.team_lookups[key]
 
     def identify_objective_progress(self, img_array, mode="standard", current_view=False):
         """ Identifies the objective progress based on the screen shot
@@ -547,13 +688,16 @@ class MapInfo(GameObject):
             self.objectiveProgress["currentType"] = map_type
 
         if self.objectiveProgress["currentType"] == "assault":
-            new_image_array = self.identify_assault_objective_progress(img_array, map_type, current_view, mode)
+            with Instrumentation.span("objective assault"):
+                new_image_array = self.identify_assault_objective_progress(img_array, map_type, current_view, mode)
 
         if self.objectiveProgress["currentType"] == "control":
-            new_image_array = self.identify_control_objective_progress(img_array, mode)
+            with Instrumentation.span("objective control"):
+                new_image_array = self.identify_control_objective_progress(img_array, mode)
 
         if self.objectiveProgress["currentType"] == "escort":
-            new_image_array = self.identify_escort_objective_progress(img_array, map_type, current_view, mode)
+            with Instrumentation.span("objective escort"):
+                new_image_array = self.identify_escort_objective_progress(img_array, map_type, current_view, mode)
 
         if mode == "for_reference" and new_image_array is not None:
             # save image
@@ -562,22 +706,19 @@ class MapInfo(GameObject):
 
         return True
 
-    def identify_assault_objective_progress(self, img_array, map_type, current_view, mode="standard", loop_count=0):
+    def identify_assault_objective_progress(self, img_array, map_type, current_view, mode="standard"):
         """ Identifies the assault objective progress based on the screen shot
 
         :param img_array: Numpy Array of screen shot
         :param map_type: String of map type to be used for cropping dimensions
         :param current_view: Boolean or String, String is of the view identified when detecting the map
         :param mode: String, used for specifying debugging or saving for reference
-        :param loop_count: Integer of how many times this function has called itself
         :return: None if transitioning, Numpy array of objective UI otherwise
         """
 
-        # The only time to check if this is a competitive mode is immediately after a tab view
-        if self.check_competitive and current_view != "Tab":
-            self.competitive = self.identify_competitive(img_array, mode)
-            self.check_competitive = False
-            print("Competitive: " + str(self.competitive))
+        self.check_competitive_mode(img_array, current_view, mode)
+        if not self.competitive_confirmed:
+            self.identify_assault_layout(img_array, map_type)
 
         competitive_string = self.get_competitive_string()
 
@@ -603,7 +744,7 @@ class MapInfo(GameObject):
             if self.debugMode:
                 # save image
                 img = Image.fromarray(new_image_array)
-                img.save("Debug\\Potential Assault Point 1 " + str(loop_count) + ".png", "PNG")
+                img.save("Debug\\Potential Assault Point 1 " + competitive_string + ".png", "PNG")
 
             if potential[this_status] > self.imageThreshold["Assault"]:
                 check_game_end = False
@@ -651,7 +792,7 @@ class MapInfo(GameObject):
             if self.debugMode:
                 # save image
                 img = Image.fromarray(new_image_array)
-                img.save("Debug\\Potential Assault Point 2 " + str(loop_count) + ".png", "PNG")
+                img.save("Debug\\Potential Assault Point 2 " + competitive_string + ".png", "PNG")
 
             if potential[this_status_not_split] > self.imageThreshold["Assault"]:
                 check_game_end = False
@@ -662,15 +803,7 @@ class MapInfo(GameObject):
                 else:
                     self.objectiveProgress["unlocked"] = False
         if check_game_end:
-            if not self.competitive_confirmed and loop_count == 0:
-                self.competitive = not self.competitive
-                print("Try Competitive: " + str(self.competitive))
-                new_image_array = self.identify_assault_objective_progress(
-                    img_array, map_type, current_view, mode, loop_count=1)
-            else:
-                if loop_count == 1:
-                    self.competitive = not self.competitive
-                self.identify_game_end(img_array, mode)
+            self.identify_game_end(img_array, mode)
         else:
             if this_status != self.objectiveProgress["assaultPoint"]:
                 self.objectiveProgress["assaultPoint"] = this_status
@@ -679,6 +812,51 @@ class MapInfo(GameObject):
 
         return new_image_array
 
+    def identify_assault_layout(self, img_array, map_type):
+        """ Until the objective confirms the mode, the first region the objective is read from is scored in both the
+        quick and the competitive layout at once, and the layout that matches it best is used.
+        On a transition map whose first point does not match in either layout, the "done" region is scored the same
+        way. If neither layout matches, the mode identified from the HUD is kept
+
+        :param img_array: Numpy Array of screen shot
+        :param map_type: String of map type to be used for cropping dimensions
+        :return: None
+        """
+        if self.objectiveProgress["assaultPoint"] == "B":
+            regions = [("assault", "point2")]
+        else:
+            regions = [(map_type, "point1")]
+            if map_type == "transition":
+                regions.append((map_type, "done"))
+
+        layouts = [(self.competitive, self.get_competitive_string()),
+                   (not self.competitive, "quick" if self.competitive else "competitive")]
+        # the mode identified from the HUD is first, so it wins a tie
+        positions = None
+        for region_map_type, region in regions:
+            objective_image_arrays = [self.cut_and_threshold(img_array, self.dimensions[region_map_type][layout][region])
+                                      for competitive, layout in layouts]
+            matched, complemented_matched, total = self.assaultReference.score_batch(objective_image_arrays)
+            if positions is None:
+                positions = np.arange(len(self.assaultReference.names))
+            best_layout = None
+            best_potential = self.imageThreshold["Assault"]
+            for layout_index, (competitive, layout) in enumerate(layouts):
+                potential = self.assaultReference.scores_to_ratios(positions, matched[layout_index], total)
+                if len(potential) == 0:
+                    continue
+                this_status = max(potential.keys(), key=(lambda k: potential[k]))
+                if region == "done" and this_status.split("-")[0] not in ("Locked", "Done"):
+                    continue
+                if potential[this_status] > best_potential:
+                    best_layout = competitive
+                    best_potential = potential[this_status]
+            if best_layout is not None:
+                if best_layout != self.competitive:
+                    self.competitive = best_layout
+                    print("Competitive: " + str(self.competitive))
+                return
+
     def identify_assault_point_progress(self, img_array, map_type, competitive_string, point_number, mode="standard"):
         """ Identifies the assault objective progress based on the screen shot
 
@@ -690,38 +868,33 @@ class MapInfo(GameObject):
         :return: None
         """
 
-        assault_percent_complete = 0
-        img_copy = img_array.copy()
-        img_copy.setflags(write=1)
-        fail_count = 0
-        for percent, pixelCoordinates in \
-                enumerate(self.assaultPixelsToCheck[map_type][competitive_string][point_number]):
-            x_coordinate = pixelCoordinates[0]
-            y_coordinate = pixelCoordinates[1]
-            this_pixel = img_array[y_coordinate][x_coordinate]
-            debug_color = 0
-            pixel_side = self.team_from_pixel_assault_circle(this_pixel, opposite=True)
-            assault_percent_complete = assault_percent_complete + 1
-            if self.currentMapSide == pixel_side:
-                debug_color = 255
-                fail_count = 0
-            else:
-                fail_count += 1
-                if fail_count == 10 or percent == 100:
-                    assault_percent_complete -= fail_count
-                    break
-
-            if mode != "standard":
-                print(str(percent) + " " + str(self.currentMapSide == pixel_side) + " " +
-                      str([x_coordinate, y_coordinate]) + str(this_pixel))
+        fail_run = 10  # misses in a row that end the filled part of the circle
+        y_coordinates, x_coordinates = self.assaultPixelsToCheck[map_type][competitive_string][point_number]
+        pixels = img_array[y_coordinates, x_coordinates]
+        pixel_sides = self.teams_from_pixels(pixels, "assault_circle", opposite=True)
+        matches = pixel_sides == self.currentMapSide
+
+        # the progress is where the first run of misses starts, all of it if there is none
+        miss_runs = np.convolve(~matches, np.ones(fail_run, dtype=int), mode="valid")
+        run_starts = np.flatnonzero(miss_runs == fail_run)
+        if len(run_starts):
+            assault_percent_complete = int(run_starts[0])
+            checked_count = assault_percent_complete + fail_run - 1  # the pixel ending the run is not shown
+        else:
+            assault_percent_complete = len(matches)
+            checked_count = len(matches)
 
-            img_copy[y_coordinate][x_coordinate][0] = debug_color
-            img_copy[y_coordinate][x_coordinate][1] = debug_color
-            img_copy[y_coordinate][x_coordinate][2] = debug_color
+        if mode != "standard":
+            for percent in range(checked_count):
+                print(str(percent) + " " + str(bool(matches[percent])) + " " +
+                      str([int(x_coordinates[percent]), int(y_coordinates[percent])]) + str(pixels[percent]))
 
         self.objectiveProgress["assaultPointProgress"] = assault_percent_complete
         print("Percent Complete: " + str(assault_percent_complete))
         if self.debugMode:
+            img_copy = img_array.copy()
+            debug_colors = np.where(matches[:checked_count], 255, 0)
+            img_copy[y_coordinates[:checked_count], x_coordinates[:checked_count], :3] = debug_colors[:, np.newaxis]
             img = Image.fromarray(img_copy)
             img.save("Debug\\Assault Progress.png", "PNG")
 
@@ -733,58 +906,53 @@ class MapInfo(GameObject):
         :return: Numpy array of objective UI
         """
 
-        pixel_current_height = 118
-        pixel_side_height = 91
-        reference = self.controlReference
-        status_addendum = ""
-        objective_image_array = self.cut_and_threshold(img_array, self.dimensions["control"]["normal"])
-        objective_identified = self.identify_control_core(img_array, objective_image_array, pixel_current_height,
-                                                          pixel_side_height, reference, status_addendum)
-        self.objectiveProgress["unlocked"] = True
+        # every region the objective can be in is scored against every reference (and its complement, for a black
+        # background) at once, then the regions are checked in order
+        regions = ("normal", "locked", "overtime")
+        objective_image_arrays = [self.cut_and_threshold(img_array, self.dimensions["control"][region])
+                                  for region in regions]
+        matched, complemented_matched, total = self.controlReference.score_batch(objective_image_arrays)
+        positions = np.arange(len(self.controlReference.names))
+        locked_position = self.controlReference.names.index("Locked")
+        locked_matched = int(complemented_matched[1][locked_position])
+        prepare_potential = {}
+        if locked_matched:
+            prepare_potential["Prepare"] = locked_matched / int(total[locked_position])
 
-        if objective_identified is False:
+        self.objectiveProgress["unlocked"] = True
+        attempts = [
+            # region, potential, pixel_current_height, pixel_side_height, status_addendum
+            (0, self.controlReference.scores_to_ratios(positions, matched[0], total), 118, 91, ""),
             # check if not controlled with a black background
-            inverted_objective_image_array = self.invert_image_array(objective_image_array)
-            objective_identified = self.identify_control_core(img_array, inverted_objective_image_array,
-                                                              pixel_current_height, pixel_side_height, reference,
-                                                              status_addendum)
-
-        if objective_identified is False:
-            # check if locked between rounds
-            pixel_current_height = 145
-            pixel_side_height = 128
-            reference = {"Prepare": self.controlReference["Locked"]}
-            status_addendum = ""
-            objective_image_array = self.cut_and_threshold(img_array, self.dimensions["control"]["locked"])
-            inverted_objective_image_array = self.invert_image_array(objective_image_array)
-            objective_identified = self.identify_control_core(img_array, inverted_objective_image_array,
-                                                              pixel_current_height, pixel_side_height, reference,
-                                                              status_addendum)
-        if objective_identified is False:
+            (0, self.controlReference.scores_to_ratios(positions, complemented_matched[0], total), 118, 91, ""),
+            # check if locked between rounds, with a black background
+            (1, prepare_potential, 145, 128, ""),
             # check for overtime
-            pixel_current_height = 163
-            pixel_side_height = 146
-            reference = self.controlReference
-            status_addendum = "-Overtime"
-            objective_image_array = self.cut_and_threshold(img_array, self.dimensions["control"]["overtime"])
-            objective_identified = self.identify_control_core(img_array, objective_image_array, pixel_current_height,
-                                                              pixel_side_height, reference, status_addendum)
+            (2, self.controlReference.scores_to_ratios(positions, matched[2], total), 163, 146, "-Overtime"),
+        ]
+        objective_identified = False
+        region_index = 0
+        for region_index, potential, pixel_current_height, pixel_side_height, status_addendum in attempts:
+            objective_identified = self.identify_control_core(img_array, potential, pixel_current_height,
+                                                              pixel_side_height, status_addendum)
+            if objective_identified:
+                break
+
         if objective_identified is False:
             self.identify_game_end(img_array, mode)
         else:
             self.objectiveProgress["unlocked"] = False
 
-        return objective_image_array
+        return objective_image_arrays[region_index]
 
-    def identify_control_core(self, full_screen_img_array, objective_image_array, pixel_current_height,
-                              pixel_side_height, reference, status_addendum):
+    def identify_control_core(self, full_screen_img_array, potential, pixel_current_height, pixel_side_height,
+                              status_addendum):
         """ Attempts to identify the control objective progress
 
         :param full_screen_img_array: Numpy Array of screen shot
-        :param objective_image_array: Numpy Array of potential objective to check
+        :param potential: Dictionary of the scores of the potential objective against the control references
         :param pixel_current_height: Int of pixel's y value to find objective's current controlling team
         :param pixel_side_height: Int of pixel's y value to find number of rounds won
-        :param reference: Dictionary of images to check
         :param status_addendum: String, used for elaborating on the current status e.g. overtime
         :return: Boolean of successfully identifying objective
         """
@@ -795,25 +963,22 @@ class MapInfo(GameObject):
         our_progress = 0
         their_progress = 0
 
-        potential = self.what_image_is_this(objective_image_array, reference)
         this_status = max(potential.keys(), key=(lambda k: potential[k]))
 
         successfully_identified = potential[this_status] > self.imageThreshold["Control"]
 
         if successfully_identified:
-            pixel_to_check = {
-                'current': full_screen_img_array[pixel_current_height][959],
-                'left': {
-                    0: full_screen_img_array[pixel_side_height][774],
-                    1: full_screen_img_array[pixel_side_height][814]
-                },
-                'right': {
-                    0: full_screen_img_array[pixel_side_height][1146],
-                    1: full_screen_img_array[pixel_side_height][1106]
-                }
+            # the current controller, then the rounds won on the left and on the right
+            pixel_sides = self.teams_from_pixels(full_screen_img_array[
+                [pixel_current_height, pixel_side_height, pixel_side_height, pixel_side_height, pixel_side_height],
+                [959, 774, 814, 1146, 1106]
+            ])
+            side_pixel_sides = {
+                'left': pixel_sides[1:3],
+                'right': pixel_sides[3:5]
             }
             if this_status not in ["Locked", "Prepare"]:
-                this_side = self.team_from_pixel(pixel_to_check["current"])
+                this_side = str(pixel_sides[0])
                 print("Current Controller: " + this_side)
 
             if (self.objectiveProgress["controlProgress"][1] is None and this_status != "Prepare")\
@@ -827,13 +992,11 @@ class MapInfo(GameObject):
                 our_progress = self.objectiveProgress["controlProgress"][1]
                 their_progress = self.objectiveProgress["controlProgress"][2]
             else:
-                for pixelIndex, thisPixel in pixel_to_check["left"].items():
-                    team_result = self.team_from_pixel(thisPixel)
+                for pixelIndex, team_result in enumerate(side_pixel_sides["left"]):
                     if team_result == "neither":
                         our_progress = pixelIndex
                         break
-                for pixelIndex, thisPixel in pixel_to_check["right"].items():
-                    team_result = self.team_from_pixel(thisPixel)
+                for pixelIndex, team_result in enumerate(side_pixel_sides["right"]):
                     if team_result == "neither":
                         their_progress = pixelIndex
                         break
@@ -882,8 +1045,7 @@ class MapInfo(GameObject):
         """
         dimensions = self.dimensions["control"]["competitive"][team_side + "_score"]
         new_image_array = self.cut_image(img_array, dimensions)
-        img = Image.fromarray(new_image_array)
-        scaled_image_array = self.threshold(np.asarray((img.resize((8, 11), Image.BILINEAR))))
+        scaled_image_array = self.threshold(Resampler.resize(new_image_array, (8, 11)))
 
         if self.debugMode:
             # save image
@@ -908,10 +1070,7 @@ class MapInfo(GameObject):
         :param mode: String, used for specifying debugging or saving for reference
         :return: Numpy array of objective UI
         """
-        if self.check_competitive and current_view != "Tab":
-            self.competitive = self.identify_competitive(img_array, mode)
-            self.check_competitive = False
-            print("Competitive: " + str(self.competitive))
+        self.check_competitive_mode(img_array, current_view, mode)
 
         competitive_string = self.get_competitive_string()
 
@@ -956,37 +1115,29 @@ class MapInfo(GameObject):
 
         dimensions = self.dimensions[map_type][competitive_string]["progress_bar"]
 
-        for X in range(0, (dimensions["end_x"] - dimensions["start_x"])):
-            pixel_to_check = new_image_array[5][X]
-            pixel_team = self.team_from_pixel(pixel_to_check, opposite=True)
-            if pixel_team != self.currentMapSide:
-                percent_complete = round(X / (dimensions["end_x"] - dimensions["start_x"]) * 100)
-                print("Percent Complete: " + str(percent_complete))
-                end_found = True
-                break
+        bar_width = dimensions["end_x"] - dimensions["start_x"]
+        bar_pixels = new_image_array[5][:bar_width]
+        other_pixels = self.teams_from_pixels(bar_pixels, opposite=True) != self.currentMapSide
+        edge = int(np.argmax(other_pixels))  # first pixel not in our team's color
+        if other_pixels[edge]:
+            if self.escort_subpixel:
+                percent_complete = round(self.subpixel_edge(bar_pixels, edge) / bar_width * 100, 1)
+            else:
+                percent_complete = round(edge / bar_width * 100)
+            print("Percent Complete: " + str(percent_complete))
+            end_found = True
 
         if not end_found:
             percent_complete = 100
             print("Percent Complete: 100 - Complete Color Change")
 
-        escort_progress_length = len(self.objectiveProgress["escortProgress"])
-
         # check to see if we can confirm the statistics has started, unlocking the Escort Objective
-        self.objectiveProgress["escortProgress"].append(percent_complete)
-
-        if escort_progress_length > 2:
-            if self.objectiveProgress["unlocked"] is False:
-                minimum = 101
-                maximum = -1
-                for thisEscortProgress in self.objectiveProgress["escortProgress"]:
-                    if thisEscortProgress > maximum:
-                        maximum = thisEscortProgress
-                    if thisEscortProgress < minimum:
-                        minimum = thisEscortProgress
-                if minimum != 0 and (maximum - minimum) < 5:
-                    self.objectiveProgress["unlocked"] = True
-
-            del self.objectiveProgress["escortProgress"][0]
+        escort_progress = self.objectiveProgress["escortProgress"]
+        if len(escort_progress) == escort_progress.maxlen and self.objectiveProgress["unlocked"] is False:
+            minimum = min(min(escort_progress), percent_complete)
+            if minimum != 0 and (max(max(escort_progress), percent_complete) - minimum) < 5:
+                self.objectiveProgress["unlocked"] = True
+        escort_progress.append(percent_complete)
 
         # print(str(self.objectiveProgress["escortProgress"]))
 
@@ -996,16 +1147,24 @@ class MapInfo(GameObject):
         return new_image_array
 
     @staticmethod
-    def invert_image_array(image_array):
-        new_array = image_array.copy()
-        new_array.setflags(write=1)
-        for row_index, row in enumerate(image_array):
-            for pixel_index, pixel in enumerate(row):
-                if pixel[0] == 0:
-                    new_array[row_index][pixel_index] = [255, 255, 255]
-                else:
-                    new_array[row_index][pixel_index] = [0, 0, 0]
-        return new_array
+    def subpixel_edge(bar_pixels, edge):
+        """ Estimates where the progress bar ends within its edge pixel, from how close the edge pixel's color is
+        to the filled pixel before it rather than the empty pixel after it
+
+        :param bar_pixels: Numpy Array of a row of the progress bar
+        :param edge: Int of the first pixel not in the team's color
+        :return: Float of the end of the progress bar in pixels
+        """
+        if edge == 0 or edge + 1 >= len(bar_pixels):
+            return float(edge)
+        filled = bar_pixels[edge - 1][:3].astype(np.float64)
+        empty = bar_pixels[edge + 1][:3].astype(np.float64)
+        difference = filled - empty
+        squared_distance = np.dot(difference, difference)
+        if squared_distance == 0:
+            return float(edge)
+        filled_share = np.dot(bar_pixels[edge][:3] - empty, difference) / squared_distance
+        return edge + float(np.clip(filled_share, 0, 1))
 
     def get_competitive_string(self):
         """ Returns either "competitive" or "quick" based on competitive boolean
@@ -1017,6 +1176,24 @@ class MapInfo(GameObject):
         else:
             return "quick"
 
+    def check_competitive_mode(self, img_array, current_view, mode="standard"):
+        """ Checks if this is a competitive mode, which is only possible immediately after a tab view.
+        The HUD is only scanned once until the map or side changes, and a mode confirmed by the objective is kept
+
+        :param img_array: Numpy Array of screen shot
+        :param current_view: Boolean or String, String is of the view identified when detecting the map
+        :param mode: String, used for specifying debugging or saving for reference
+        :return: None
+        """
+        if not self.check_competitive or current_view == "Tab":
+            return
+        if not self.competitive_confirmed:
+            if self.competitive_scan is None:
+                self.competitive_scan = self.identify_competitive(img_array, mode)
+            self.competitive = self.competitive_scan
+        self.check_competitive = False
+        print("Competitive: " + str(self.competitive))
+
     def identify_competitive(self, img_array, mode="standard"):
         """ Identifies if the current mode is competitive or not
 
@@ -1026,34 +1203,41 @@ class MapInfo(GameObject):
         """
 
         # check to see if there is a red or blue box (depending on team)
-        box_beginning = 0
-        box_end = 0
-        x_coordinate = 0
         team_side = self.currentMapSide
-        for x_coordinate in range(self.dimensions["competitive"][team_side]["start_x"],
-                       self.dimensions["competitive"][team_side]["end_x"]):
-            pixel_to_check = img_array[self.dimensions["competitive"][team_side]["y"]][x_coordinate]
-            pixel_side = self.team_from_pixel_precise(pixel_to_check, opposite=True)
-            if mode == "for_reference":
-                print(str(x_coordinate) + " " + str(pixel_to_check) + " " + pixel_side)
-            if pixel_side == team_side and box_beginning == 0:
-                box_beginning = x_coordinate
-            elif pixel_side == "neither" and box_beginning != 0 and box_end == 0:
-                if 45 <= (x_coordinate - box_beginning) <= 124:
-                    # Approximate size of box, may be larger when in bright light
-                    if mode == "for_reference":
-                        box_end = x_coordinate
-                        print(str(box_beginning) + " " + str(box_end))
-                    return True
-                else:
-                    box_beginning = 0
-        # if it reaches the end of the for loop and is still the right color:
-        if box_beginning != 0 and box_end == 0 and (45 <= (x_coordinate - box_beginning) <= 124):
-            if mode == "for_reference":
-                box_end = x_coordinate
-                print(str(box_beginning) + " " + str(box_end))
-            return True
-        return False
+        start_x = self.dimensions["competitive"][team_side]["start_x"]
+        end_x = self.dimensions["competitive"][team_side]["end_x"]
+        strip = img_array[self.dimensions["competitive"][team_side]["y"]][start_x:end_x]
+        strip_sides = self.teams_from_pixels(strip, "precise", opposite=True)
+
+        # a box starts at a pixel of our team's color and ends at the next pixel of neither team's color
+        box_pixels = np.flatnonzero(strip_sides == team_side)
+        neither_pixels = np.flatnonzero(strip_sides == "neither")
+        competitive = False
+        checked_end = len(strip) - 1
+        box_beginning = box_end = None
+        box_index = 0
+        while box_index < len(box_pixels):
+            box_beginning = int(box_pixels[box_index])
+            end_index = np.searchsorted(neither_pixels, box_beginning)
+            if end_index == len(neither_pixels):
+                # if it reaches the end of the strip and is still the right color:
+                box_end = len(strip) - 1
+                competitive = 45 <= (box_end - box_beginning) <= 124
+                break
+            box_end = int(neither_pixels[end_index])
+            if 45 <= (box_end - box_beginning) <= 124:
+                # Approximate size of box, may be larger when in bright light
+                competitive = True
+                checked_end = box_end
+                break
+            box_index = np.searchsorted(box_pixels, box_end)
+
+        if mode == "for_reference":
+            for x_index in range(checked_end + 1):
+                print(str(start_x + x_index) + " " + str(strip[x_index]) + " " + strip_sides[x_index])
+            if competitive:
+                print(str(start_x + box_beginning) + " " + str(start_x + box_end))
+        return competitive
 
     def identify_game_end(self, img_array, mode="standard"):
         """ Identifies if the game is over by checking for "Victory" or "Defeat"
@@ -1072,10 +1256,10 @@ class MapInfo(GameObject):
             img = Image.fromarray(cropped_image_array)
             img.save("Debug\\" + "Game End Cropped.png", "PNG")
 
-        # -- Check for Victory  -- #
-        # convert to black and white based on yellow
-        yellow = [230, 205, 141]
-        result = self.game_end_format_image(cropped_image_array, yellow, "Victory")
+        # -- Check for Victory, then Defeat -- #
+        # convert to black and white based on yellow or red, both in one pass over the crop
+        game_end_masks = self.game_end_masks(cropped_image_array)
+        result = self.game_end_format_image(cropped_image_array, game_end_masks["Victory"], "Victory")
         if type(result) is not bool:
             reference_dictionary = {
                 'Victory': self.gameEndReference["Victory"]
@@ -1087,9 +1271,7 @@ class MapInfo(GameObject):
                 print("Victory!")
                 self.set_game_over()
         if self.objectiveProgress["gameEnd"] != "Victory":
-            # -- Check for Defeat -- #
-            red = [210, 120, 130]
-            result = self.game_end_format_image(cropped_image_array, red, "Defeat")
+            result = self.game_end_format_image(cropped_image_array, game_end_masks["Defeat"], "Defeat")
             if type(result) is not bool:
                 reference_dictionary = {
                     'Defeat': self.gameEndReference["Defeat"]
@@ -1104,107 +1286,51 @@ class MapInfo(GameObject):
             # save image
             result.save("Debug\\Game End.png", "PNG")
 
-    def game_end_format_image(self, image_array, color, mode):
-        """ Identifies if the game is over by checking for "Victory" or "Defeat"
+    @staticmethod
+    def game_end_masks(image_array):
+        """ Finds the pixels in the colors of "Victory" (yellow) and "Defeat" (red)
 
-        :param image_array: Numpy Array of screen shot
-        :param color: List of RGB pixels to be used as middle for thresholding
-        :param mode: String, used for specifying debugging or saving for reference
-        :return: None
+        :param image_array: Numpy Array of the game end crop
+        :return: Dictionary of 2D Numpy Arrays of booleans, True for pixels in the text's color
         """
+        red = image_array[..., 0]
+        green = image_array[..., 1]
+        blue = image_array[..., 2]
+        yellow_color = [230, 205, 141]  # greater, greater, less
+        red_color = [210, 120, 130]  # greater, less, less
+        return {
+            "Victory": (red > yellow_color[0]) & (green > yellow_color[1]) & (blue < yellow_color[2]),
+            "Defeat": (red > red_color[0]) & (green < red_color[1]) & (blue < red_color[2])
+        }
 
-        cropped_image_array = image_array.copy()
-        cropped_image_array.setflags(write=True)
-
-        # img = Image.fromarray(cropped_image_array)
-        # cropped_image_array = np.asarray((img.resize((200, 56), Image.BILINEAR)))
-        # cropped_image_array.setflags(write=True)
-
-        black_check_column = {}
-        rows_to_cut = []
-        columns_to_cut = []
-        cropped_image_array_length = len(cropped_image_array) - 1
-        previous_row = None
-        previous_column = None
-
-        # threshold image to B&W
-        for rowNumber, eachRow in enumerate(cropped_image_array):
-            black_check_row = True
-            for pixelNumber, eachPixel in enumerate(eachRow):
-                if rowNumber == 0:
-                    black_check_column[pixelNumber] = True
-
-                go_white = False
-                if mode == "Victory":
-                    if (eachPixel[0] > color[0]) \
-                            and (eachPixel[1] > color[1]) \
-                            and (eachPixel[2] < color[2]):  # greater, greater, less
-                        go_white = True
-                elif mode == "Defeat":
-                    if (eachPixel[0] > color[0]) \
-                            and (eachPixel[1] < color[1]) \
-                            and (eachPixel[2] < color[2]):  # greater, less, less
-                        go_white = True
-                if go_white:
-                    cropped_image_array[rowNumber][pixelNumber] = [255, 255, 255]  # White
-                    black_check_row = False
-                    black_check_column[pixelNumber] = False
-                else:
-                    cropped_image_array[rowNumber][pixelNumber] = [0, 0, 0]  # Black
-                # crop box where entire column is black
-
-                if rowNumber == cropped_image_array_length and black_check_column[pixelNumber] is True:
-                    columns_to_cut.append(pixelNumber)
-            # crop box where entire row is black
-            if black_check_row:
-                rows_to_cut.append(rowNumber)
-
-        # cut image where entire rows are black
-        new_dimensions = {}
-
-        # get dimensions to cut top edge
-        for index, this_row in enumerate(rows_to_cut):
-            if index != 0:
-                if previous_row + 1 != this_row:
-                    new_dimensions["start_y"] = previous_row
-                    break
-            previous_row = this_row
-        # get dimensions to cut bottom edge
-        for index, this_row in enumerate(reversed(rows_to_cut)):
-            if index != 0:
-                if previous_row - 1 != this_row:
-                    new_dimensions["end_y"] = previous_row
-                    break
-            previous_row = this_row
-        # far left  --  Only crop far left and right, not between letters
-        for index, thisColumn in enumerate(columns_to_cut):
-            if index != 0:
-                if previous_column + 1 != thisColumn:
-                    new_dimensions["start_x"] = previous_column
-                    break
-            previous_column = thisColumn
-        # far right
-        for index, thisColumn in enumerate(reversed(columns_to_cut)):
-            if index != 0:
-                if previous_column - 1 != thisColumn:
-                    new_dimensions["end_x"] = previous_column
-                    break
-            previous_column = thisColumn
-        column_names = ("start_y", "end_y", "start_x", "start_y")
-        if not all(name in new_dimensions for name in column_names):
+    def game_end_format_image(self, image_array, text_mask, mode):
+        """ Crops the game end text to its bounding box and scales it to the size of the references
+
+        :param image_array: Numpy Array of the game end crop
+        :param text_mask: 2D Numpy Array of booleans, True for pixels in the text's color
+        :param mode: String of the text to format, "Victory" or "Defeat"
+        :return: Image of the formatted text, or False if the text's bounding box was not found
+        """
+        # crop box where entire rows or columns are black, only the far edges and not between letters
+        rows = self.outer_black_edges(~text_mask.any(axis=1))
+        columns = self.outer_black_edges(~text_mask.any(axis=0))
+        if rows is None or columns is None:
             return False
+        new_dimensions = {"start_y": rows[0], "end_y": rows[1], "start_x": columns[0], "end_x": columns[1]}
 
-        # save image
-        img = Image.fromarray(cropped_image_array)
-        img.save("Debug\\" + mode + ".png", "PNG")
+        if self.debugMode:
+            # save image
+            img = Image.fromarray(self.mask_to_image(image_array, text_mask))
+            img.save("Debug\\" + mode + ".png", "PNG")
 
-        new_cropped_image_array = self.cut_image(cropped_image_array, new_dimensions)
-        img = Image.fromarray(new_cropped_image_array)
-        scaled_image_array = self.threshold(np.asarray((img.resize((160, 45), Image.BILINEAR))))
+        new_cropped_image_array = self.mask_to_image(self.cut_image(image_array, new_dimensions),
+                                                     self.cut_image(text_mask, new_dimensions))
+        scaled_image_array = self.threshold(Resampler.resize(new_cropped_image_array, (160, 45)))
         scaled_image = Image.fromarray(scaled_image_array)
 
-        # save image
-        scaled_image.save("Debug\\" + mode + " scaled.png", "PNG")
+        if self.debugMode:
+            # save image
+            scaled_image.save("Debug\\" + mode + " scaled.png", "PNG")
 
         if len(scaled_image_array[0]) != len(self.gameEndReference["Victory"][0])\
                 and len(scaled_image_array) != len(self.gameEndReference["Victory"]):
@@ -1212,6 +1338,20 @@ class MapInfo(GameObject):
         else:
             return scaled_image
 
+    @staticmethod
+    def outer_black_edges(black_lines):
+        """ Finds where the text starts and ends: the last black line of the first run of black lines and the first
+        black line of the last run
+
+        :param black_lines: 1D Numpy Array of booleans, True for entirely black rows or columns
+        :return: Tuple of Ints of the start and end, or None if the black lines are not split by the text
+        """
+        black_indices = np.flatnonzero(black_lines)
+        gaps = np.flatnonzero(np.diff(black_indices) != 1)
+        if not len(gaps):
+            return None
+        return int(black_indices[gaps[0]]), int(black_indices[gaps[-1] + 1])
+
     @staticmethod
     def cut_image(img_array, dimensions):
         map_image = img_array[dimensions["start_y"]:dimensions["end_y"], dimensions["start_x"]:dimensions["end_x"]]
@@ -1240,7 +1380,8 @@ class MapInfo(GameObject):
 
         options_to_send = ["options", this_map]
         if broadcaster != "debug":
-            broadcaster.publish(broadcaster.subscriptionString, options_to_send)
+            with Instrumentation.span("broadcast options"):
+                broadcaster.publish(broadcaster.subscriptionString, options_to_send)
 
     def set_game_over(self):
         self.objectiveProgress["gameOver"] = True
@@ -1258,6 +1399,9 @@ class MapInfo(GameObject):
         objective_dictionary = copy.deepcopy(self.objectiveProgress)
         del objective_dictionary["gameOver"]
         del objective_dictionary["gameEnd"]
+        if "escortProgress" in objective_dictionary:
+            # a list, like the rest of the progress, so it can be broadcast as JSON
+            objective_dictionary["escortProgress"] = list(objective_dictionary["escortProgress"])
 
         return objective_dictionary
 
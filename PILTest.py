@@ -1,10 +1,10 @@
 from PIL import Image, ImageFilter, ImageOps
-from scipy.misc import imresize
 from scipy.ndimage.filters import gaussian_filter
 
 import numpy as np
 
 from GameObject import GameObject
+from Resampler import Resampler
 
 
 class PILTest:
@@ -75,7 +75,7 @@ class PILTest:
                     img_array[row_number][column_number] = [0, 0, 0]
 
         blurred_image_array = gaussian_filter(img_array, 1)
-        scaled_image_array = imresize(img_array, (19, 180))
+        scaled_image_array = Resampler.resize(img_array, (180, 19))
         Image.fromarray(scaled_image_array).save("Debug\\Threshold-Before.png", "PNG")
         threshold = go.threshold(scaled_image_array)
 
@@ -0,0 +1,464 @@
+import numpy as np
+
+
+# number of set bits for every possible byte, used when numpy does not provide bitwise_count
+POPCOUNT_TABLE = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def pack_bits(bit_arrays):
+    """ Packs boolean images into rows of 64 bit words, one row per image
+
+    :param bit_arrays: Numpy Array of booleans (N, height, width)
+    :return: Numpy Array of uint64 words (N, words)
+    """
+    packed = np.packbits(bit_arrays.reshape(len(bit_arrays), -1), axis=1)
+    padding = -packed.shape[1] % 8
+    if padding:
+        # np.pad costs more than the packing itself for a single image
+        padded = np.zeros((packed.shape[0], packed.shape[1] + padding), dtype=np.uint8)
+        padded[:, :packed.shape[1]] = packed
+        packed = padded
+    return np.ascontiguousarray(packed).view("<u8")
+
+
+def popcount(words):
+    """ Counts the set bits of each row of words
+
+    :param words: Numpy Array of uint64 words (..., words)
+    :return: Numpy Array of bit counts (...)
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    word_bytes = words.view(np.uint8).reshape(words.shape[:-1] + (-1,))
+    return POPCOUNT_TABLE[word_bytes].sum(axis=-1, dtype=np.int64)
+
+
+def block_popcount(words, block_words):
+    """ Counts the set bits of each block of consecutive words, a low resolution popcount
+
+    :param words: Numpy Array of uint64 words (..., words)
+    :param block_words: Int of words per block, the last block may be shorter
+    :return: Numpy Array of bit counts (..., blocks)
+    """
+    word_counts = popcount(words[..., np.newaxis])
+    return np.add.reduceat(word_counts, np.arange(0, words.shape[-1], block_words), axis=-1)
+
+
+class ReferenceImages(dict):
+    """ Dictionary of reference images (name -> 2D array of 0/255 pixels) that also keeps every image stacked into
+    a single tensor, so a captured image can be scored against all references in one array comparison.
+    Black and white references are bit-packed and scored with XOR and popcount.
+    The stacked tensor is built on first use, so the dictionary should be treated as read-only afterwards.
+    """
+
+    signature_words = 4  # words per block of the low resolution signature cascade_ratios bounds the scores with
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.names = None
+        self.shape = None
+        self.images = None
+        self.extents = None
+        self.packed_images = None
+        self.packed_extents = None
+        self.packed_totals = None
+        self.packed_filter = (None, None)
+        self.packed_signature = (None, None)
+        self.ordinals = None  # original position of each reference, if they were reordered
+        self.partitioned = None
+
+    def stack(self):
+        """ Stacks the reference images into one (N, height, width) tensor, padding smaller images with zeros.
+        The extents mask marks which pixels belong to each reference image.
+        If every reference is black and white (0/255) the tensor is kept bit-packed instead.
+
+        :return: None
+        """
+        self.names = list(self.keys())
+        reference_arrays = [np.asarray(reference_image, dtype=np.uint8) for reference_image in self.values()]
+        height = max([reference_array.shape[0] for reference_array in reference_arrays])
+        width = max([reference_array.shape[1] for reference_array in reference_arrays])
+        self.shape = (height, width)
+
+        images = np.zeros((len(reference_arrays), height, width), dtype=np.uint8)
+        extents = np.zeros((len(reference_arrays), height, width), dtype=bool)
+        for index, reference_array in enumerate(reference_arrays):
+            images[index, :reference_array.shape[0], :reference_array.shape[1]] = reference_array
+            extents[index, :reference_array.shape[0], :reference_array.shape[1]] = True
+
+        if np.all((images == 0) | (images == 255)):
+            self.packed_images = pack_bits(images == 255)
+            self.packed_extents = pack_bits(extents)
+            self.packed_totals = popcount(self.packed_extents)
+        else:
+            self.images = images
+            self.extents = extents
+
+    def load_stack(self, shape, packed_images, packed_extents):
+        """ Uses an already bit-packed tensor (e.g. from the reference pack) instead of stacking the images
+
+        :param shape: Tuple of the stacked tensor's height and width
+        :param packed_images: Numpy Array of uint64 words (N, words), one row per reference image
+        :param packed_extents: Numpy Array of uint64 words (N, words), one row per reference image
+        :return: None
+        """
+        self.names = list(self.keys())
+        self.shape = tuple(shape)
+        self.packed_images = packed_images
+        self.packed_extents = packed_extents
+        self.packed_totals = popcount(packed_extents)
+
+    def take(self, indices):
+        """ Copies the given references, in the given order, keeping the stacked tensor's layout
+
+        :param indices: List of reference positions
+        :return: ReferenceImages of the given references, stacked
+        """
+        if self.names is None:
+            self.stack()
+        indices = np.asarray(indices, dtype=np.intp)
+        taken = ReferenceImages((self.names[index], self[self.names[index]]) for index in indices)
+        taken.names = list(taken.keys())
+        taken.shape = self.shape
+        if self.packed_images is not None:
+            taken.packed_images = self.packed_images[indices]
+            taken.packed_extents = self.packed_extents[indices]
+            taken.packed_totals = self.packed_totals[indices]
+        else:
+            taken.images = self.images[indices]
+            taken.extents = self.extents[indices]
+        return taken
+
+    def partitions(self, separator="-"):
+        """ Groups the references by their name before the separator, built once per reference list
+
+        :param separator: String separating the group name from the variant, e.g. "tracer-1"
+        :return: ReferencePartitions of the references
+        """
+        if self.partitioned is None:
+            self.partitioned = ReferencePartitions(self, separator)
+        return self.partitioned
+
+    def unpacked(self):
+        """ Returns the stacked tensor and extents mask as bytes, unpacking them if needed
+
+        :return: Tuple of Numpy Arrays (images, extents)
+        """
+        if self.images is None:
+            pixel_count = self.shape[0] * self.shape[1]
+            shape = (len(self.names),) + self.shape
+            image_bits = np.unpackbits(self.packed_images.view(np.uint8), axis=1)[:, :pixel_count]
+            extent_bits = np.unpackbits(self.packed_extents.view(np.uint8), axis=1)[:, :pixel_count]
+            self.images = image_bits.reshape(shape) * np.uint8(255)
+            self.extents = extent_bits.reshape(shape).astype(bool)
+        return self.images, self.extents
+
+    def fit_to_stack(self, image_array):
+        """ Crops (or pads with zeros) a 2D image to the size of the stacked tensor
+
+        :param image_array: 2D Numpy Array of image
+        :return: 2D Numpy Array of the stacked tensor's height and width
+        """
+        height, width = self.shape
+        fitted_array = image_array[:height, :width]
+        if fitted_array.shape != (height, width):
+            padded_array = np.zeros((height, width), dtype=fitted_array.dtype)
+            padded_array[:fitted_array.shape[0], :fitted_array.shape[1]] = fitted_array
+            fitted_array = padded_array
+        return fitted_array
+
+    def pack_filter(self, pixel_filter):
+        """ Packs a pixel filter into an AND mask of the reference extents, reusing the last packed filter
+
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :return: Tuple of Numpy Arrays (uint64 words (N, words), compared pixels (N))
+        """
+        if pixel_filter is None:
+            return self.packed_extents, self.packed_totals
+        if self.packed_filter[0] is not pixel_filter:
+            filter_bits = self.fit_to_stack(np.asarray(pixel_filter)) != 0
+            compared = self.packed_extents & pack_bits(filter_bits[np.newaxis])
+            self.packed_filter = (pixel_filter, (compared, popcount(compared)))
+        return self.packed_filter[1]
+
+    def pack_signature(self, pixel_filter):
+        """ Counts the compared white pixels of every reference in each block of signature_words words, a low
+        resolution signature of the references, reusing the last signature
+
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :return: Tuple of Numpy Arrays (white pixels per block (N, blocks), distinct AND masks of the compared pixels
+            (masks, words), mask of each reference (N))
+        """
+        if self.packed_signature[0] is not pixel_filter or self.packed_signature[1] is None:
+            compared, total = self.pack_filter(pixel_filter)
+            # references of the same size share their mask, so the capture is counted once per mask
+            masks, mask_indices = np.unique(compared, axis=0, return_inverse=True)
+            counts = block_popcount(self.packed_images & compared, self.signature_words)
+            self.packed_signature = (pixel_filter, (counts, masks, mask_indices.reshape(-1)))
+        return self.packed_signature[1]
+
+    def captured_bits(self, captured_array):
+        """ Returns the white pixels of a black and white (0/255 or boolean) capture
+
+        :param captured_array: 2D Numpy Array of image, fitted to the stack
+        :return: 2D Numpy Array of booleans, or None if the capture is not black and white
+        """
+        if captured_array.dtype == bool:
+            return captured_array
+        elif self.packed_images is not None and np.all((captured_array == 0) | (captured_array == 255)):
+            return captured_array == 255
+        else:
+            return None
+
+    def fit_capture(self, captured_image):
+        """ Takes the first channel of the captured image and fits it to the stack
+
+        :param captured_image: Numpy Array of image, or 2D Numpy Array of booleans
+        :return: 2D Numpy Array of the stacked tensor's height and width
+        """
+        captured_array = np.asarray(captured_image)
+        if captured_array.ndim == 3:
+            captured_array = captured_array[:, :, 0]
+        return self.fit_to_stack(captured_array)
+
+    def score(self, captured_image, pixel_filter=None, rows=None):
+        """ Counts how many pixels of the captured image match each reference image
+
+        :param captured_image: Numpy Array of image, only the first channel is compared,
+            or 2D Numpy Array of booleans, True for white pixels
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :param rows: Slice or Numpy Array of the reference positions to score, None to score all
+        :return: Tuple of Numpy Arrays (matched pixels, compared pixels), one entry per scored reference image
+        """
+        if self.names is None:
+            self.stack()
+        if rows is not None and not isinstance(rows, slice):
+            # scoring every reference and picking the rows is cheaper than copying the picked references
+            matched, total = self.score(captured_image, pixel_filter)
+            return matched[rows], total[rows]
+        if rows is None:
+            rows = slice(None)
+
+        captured_array = self.fit_capture(captured_image)
+        captured_bits = self.captured_bits(captured_array)
+
+        if self.packed_images is not None and captured_bits is not None:
+            compared, total = self.pack_filter(pixel_filter)
+            compared, total = compared[rows], total[rows]
+            captured_words = pack_bits(captured_bits[np.newaxis])
+            mismatched = popcount((self.packed_images[rows] ^ captured_words) & compared)
+            return total - mismatched, total
+
+        if captured_bits is not None:
+            captured_array = captured_bits * np.uint8(255)
+        images, compared = self.unpacked()
+        images, compared = images[rows], compared[rows]
+        if pixel_filter is not None:
+            compared = compared & (self.fit_to_stack(np.asarray(pixel_filter)) != 0)
+        matched = np.count_nonzero((images == captured_array) & compared, axis=(1, 2))
+        total = np.count_nonzero(compared, axis=(1, 2))
+        return matched, total
+
+    def score_batch(self, captured_images, pixel_filter=None):
+        """ Scores several captured images against every reference image, and against every complemented reference
+        image (black and white swapped) which scores the inverted captures without inverting them, in one comparison
+
+        :param captured_images: List of Numpy Arrays of images, only the first channel is compared
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :return: Tuple of Numpy Arrays (matched pixels (captures, N), matched pixels of the complemented references
+            (captures, N), compared pixels (N))
+        """
+        if self.names is None:
+            self.stack()
+        captured_arrays = [self.fit_capture(captured_image) for captured_image in captured_images]
+        captured_bits = [self.captured_bits(captured_array) for captured_array in captured_arrays]
+
+        if self.packed_images is not None and all(bits is not None for bits in captured_bits):
+            compared, total = self.pack_filter(pixel_filter)
+            captured_words = pack_bits(np.stack(captured_bits))
+            # a pixel that does not match a black and white reference matches its complement
+            mismatched = popcount((self.packed_images[np.newaxis] ^ captured_words[:, np.newaxis]) & compared)
+            return total - mismatched, mismatched, total
+
+        images, compared = self.unpacked()
+        if pixel_filter is not None:
+            compared = compared & (self.fit_to_stack(np.asarray(pixel_filter)) != 0)
+        complemented_images = 255 - images
+        matched = []
+        complemented_matched = []
+        for captured_array, bits in zip(captured_arrays, captured_bits):
+            if bits is not None:
+                captured_array = bits * np.uint8(255)
+            matched.append(np.count_nonzero((images == captured_array) & compared, axis=(1, 2)))
+            complemented_matched.append(np.count_nonzero((complemented_images == captured_array) & compared,
+                                                         axis=(1, 2)))
+        return np.array(matched), np.array(complemented_matched), np.count_nonzero(compared, axis=(1, 2))
+
+    def ratios(self, captured_image, pixel_filter=None, rows=None):
+        """ Scores the captured image against every reference image
+
+        :param captured_image: Numpy Array of image, only the first channel is compared,
+            or 2D Numpy Array of booleans, True for white pixels
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :param rows: Slice or Numpy Array of the reference positions to score, None to score all
+        :return: Dictionary of the scores of the comparisons (0 - 1), most similar first
+        """
+        matched, total = self.score(captured_image, pixel_filter, rows)
+        positions = np.arange(len(self.names))
+        if rows is not None:
+            positions = positions[rows]
+        return self.scores_to_ratios(positions, matched, total)
+
+    def cascade_ratios(self, captured_image, threshold, pixel_filter=None, rows=None):
+        """ Same as ratios, but only for the references that can still score above the threshold.
+        First only the low resolution signatures are compared: in each block of words, a reference mismatches at
+        least as many pixels as its count of white pixels differs from the capture's. References whose mismatches
+        already keep them at or below the threshold are dropped, and the others are scored in full.
+        If no reference can beat the threshold, only the one with the best bound is scored in full.
+
+        :param captured_image: Numpy Array of image, only the first channel is compared,
+            or 2D Numpy Array of booleans, True for white pixels
+        :param threshold: Float (0 - 1) a reference's score has to be above to be kept
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :param rows: Slice or Numpy Array of the reference positions to score, None to score all
+        :return: Dictionary of the scores of the comparisons (0 - 1), most similar first
+        """
+        if self.names is None:
+            self.stack()
+        captured_bits = self.captured_bits(self.fit_capture(captured_image))
+        if self.packed_images is None or captured_bits is None:
+            return self.ratios(captured_image, pixel_filter, rows)
+
+        positions = np.arange(len(self.names))
+        if rows is not None:
+            positions = positions[rows]
+        compared, total = self.pack_filter(pixel_filter)
+        total = total[positions]
+        captured_words = pack_bits(captured_bits[np.newaxis])[0]
+
+        reference_counts, masks, mask_indices = self.pack_signature(pixel_filter)
+        captured_counts = block_popcount(captured_words & masks, self.signature_words)
+        if rows is not None:
+            reference_counts = reference_counts[positions]
+            mask_indices = mask_indices[positions]
+        if len(masks) > 1:
+            captured_counts = captured_counts[mask_indices]
+        least_mismatched = np.abs(reference_counts - captured_counts).sum(axis=-1)
+        bounds = (total - least_mismatched) / total
+        candidates = np.flatnonzero(bounds > threshold)
+        if len(candidates) == 0 and len(positions) > 0:
+            candidates = np.array([np.argmax(bounds)])
+
+        candidate_positions = positions[candidates]
+        mismatched = popcount((self.packed_images[candidate_positions] ^ captured_words) &
+                              compared[candidate_positions])
+        return self.scores_to_ratios(candidate_positions, total[candidates] - mismatched, total[candidates])
+
+    def scores_to_ratios(self, positions, matched, total):
+        """ Turns the scores into ratios, most similar first
+
+        :param positions: Numpy Array of the scored reference positions, in increasing order
+        :param matched: Numpy Array of matched pixels, one entry per scored reference
+        :param total: Numpy Array of compared pixels, one entry per scored reference
+        :return: Dictionary of the scores of the comparisons (0 - 1), most similar first
+        """
+        # equal scores keep the (original) reference order
+        if self.ordinals is None:
+            order = np.lexsort((positions, -matched))
+        else:
+            order = np.lexsort((self.ordinals[positions], -matched))
+
+        ratios = {}
+        # references without matches are left out
+        for index in order:
+            if matched[index] == 0:
+                break
+            ratios[self.names[positions[index]]] = int(matched[index]) / int(total[index])
+        return ratios
+
+
+class ReferencePartitions:
+    """ References grouped by their name before a separator (e.g. every "tracer-..." variant), each group stored
+    contiguously so a single group, or every other group, can be scored without splitting names every frame.
+    Scores between equal matches are still ordered as in the original reference list.
+    """
+
+    def __init__(self, reference_images, separator="-"):
+        """
+        :param reference_images: ReferenceImages to group
+        :param separator: String separating the group name from the variant
+        """
+        if reference_images.names is None:
+            reference_images.stack()
+        group_names = [name.split(separator)[0] for name in reference_images.names]
+        groups = list(dict.fromkeys(group_names))
+        group_positions = {group: position for position, group in enumerate(groups)}
+        order = sorted(range(len(group_names)), key=lambda index: group_positions[group_names[index]])
+
+        self.references = reference_images.take(order)
+        self.references.ordinals = np.asarray(order, dtype=np.intp)
+        self.slices = {}
+        start = 0
+        for group in groups:
+            end = start + group_names.count(group)
+            self.slices[group] = slice(start, end)
+            start = end
+        self.views = {}
+
+    def only(self, group):
+        """ Returns the references of one group
+
+        :param group: String of the group name
+        :return: ReferenceView of the group's references
+        """
+        if ("only", group) not in self.views:
+            self.views[("only", group)] = ReferenceView(self.references, self.slices.get(group, slice(0, 0)))
+        return self.views[("only", group)]
+
+    def all_except(self, group):
+        """ Returns the references of every other group
+
+        :param group: String of the group name to leave out
+        :return: ReferenceView of every other group's references
+        """
+        if ("except", group) not in self.views:
+            group_slice = self.slices.get(group, slice(0, 0))
+            rows = np.r_[0:group_slice.start, group_slice.stop:len(self.references)]
+            self.views[("except", group)] = ReferenceView(self.references, rows)
+        return self.views[("except", group)]
+
+
+class ReferenceView:
+    """ Part of a ReferenceImages that is scored without copying the references
+    """
+
+    def __init__(self, reference_images, rows):
+        """
+        :param reference_images: ReferenceImages the references belong to
+        :param rows: Slice or Numpy Array of the reference positions
+        """
+        self.references = reference_images
+        self.rows = rows
+        self.length = len(np.arange(len(reference_images))[rows])
+
+    def __len__(self):
+        return self.length
+
+    def ratios(self, captured_image, pixel_filter=None):
+        """ Same as ReferenceImages.ratios for only this part of the references
+
+        :param captured_image: Numpy Array of image, or 2D Numpy Array of booleans
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :return: Dictionary of the scores of the comparisons (0 - 1), most similar first
+        """
+        return self.references.ratios(captured_image, pixel_filter, self.rows)
+
+    def cascade_ratios(self, captured_image, threshold, pixel_filter=None):
+        """ Same as ReferenceImages.cascade_ratios for only this part of the references
+
+        :param captured_image: Numpy Array of image, or 2D Numpy Array of booleans
+        :param threshold: Float (0 - 1) a reference's score has to be above to be kept
+        :param pixel_filter: 2D array of pixels to compare (non-zero) or skip (zero), None to compare all
+        :return: Dictionary of the scores of the comparisons (0 - 1), most similar first
+        """
+        return self.references.cascade_ratios(captured_image, threshold, pixel_filter, self.rows)
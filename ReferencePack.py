@@ -0,0 +1,133 @@
+import json
+import os
+import numpy as np
+
+from ReferenceImages import ReferenceImages
+
+
+class ReferencePack:
+    """ Every reference list compiled into one .npy file of raw bytes, loaded with np.load(mmap_mode='r').
+    The bytes start with a little-endian uint32 length and a JSON index of each reference list, followed by the
+    image data and the bit-packed reference tensors. Reference lists whose text file changed since the pack was
+    written are reported as stale, so they can be read from the text file instead.
+    """
+
+    filename = "Reference\\References.npy"
+    sources = [
+        "Reference\\HeroImageList.txt",
+        "Reference\\HeroImageListX.txt",
+        "Reference\\HeroImageBlurList.txt",
+        "Reference\\RespawnFilter.txt",
+        "Reference\\MapImageListAssault.txt",
+        "Reference\\MapImageListControl.txt",
+        "Reference\\MapImageListEscort.txt",
+        "Reference\\MapImageListHybrid.txt",
+        "Reference\\MapImageListArena.txt",
+        "Reference\\MapImageListTab.txt",
+        "Reference\\MapImageListGameType.txt",
+        "Reference\\Letters.txt",
+        "Reference\\ObjectiveListAssault.txt",
+        "Reference\\ObjectiveListControl.txt",
+        "Reference\\DigitImageList.txt",
+        "Reference\\ColonImageList.txt",
+        "Reference\\GameEnd.txt",
+    ]
+
+    opened_pack = None  # (pack file signature, byte array, index)
+
+    @staticmethod
+    def file_signature(filename):
+        file_stat = os.stat(filename)
+        return [file_stat.st_size, file_stat.st_mtime_ns]
+
+    @classmethod
+    def write(cls, reference_dictionaries):
+        """ Compiles the reference lists into the pack file
+
+        :param reference_dictionaries: Dictionary of text filenames to their ReferenceImages
+        :return: None
+        """
+        index = {}
+        data = bytearray()
+
+        def add_bytes(array):
+            data.extend(bytes(-len(data) % 8))  # keep every array aligned for 64 bit words
+            offset = len(data)
+            data.extend(np.ascontiguousarray(array).tobytes())
+            return offset
+
+        for source, reference_images in reference_dictionaries.items():
+            entry = {
+                "signature": cls.file_signature(source),
+                "images": [],
+                "stack": None
+            }
+            for name, image in reference_images.items():
+                image = np.asarray(image, dtype=np.uint8)
+                entry["images"].append([name, add_bytes(image), image.shape[0], image.shape[1]])
+            reference_images.stack()
+            if reference_images.packed_images is not None:
+                entry["stack"] = {
+                    "shape": reference_images.shape,
+                    "words": reference_images.packed_images.shape[1],
+                    "packed_images": add_bytes(reference_images.packed_images),
+                    "packed_extents": add_bytes(reference_images.packed_extents)
+                }
+            index[source] = entry
+
+        header = json.dumps(index).encode("utf-8")
+        header_length = 4 + len(header)
+        header_length = header_length + (-header_length % 8)
+        pack_bytes = bytearray(np.uint32(len(header)).astype("<u4").tobytes())
+        pack_bytes.extend(header)
+        pack_bytes.extend(bytes(header_length - len(pack_bytes)))
+        pack_bytes.extend(data)
+        np.save(cls.filename, np.frombuffer(bytes(pack_bytes), dtype=np.uint8))
+        cls.opened_pack = None
+
+    @classmethod
+    def open(cls):
+        """ Memory maps the pack file, reusing the mapping while the file is unchanged
+
+        :return: Tuple (byte array, index) or None if there is no pack file
+        """
+        if not os.path.isfile(cls.filename):
+            return None
+        signature = cls.file_signature(cls.filename)
+        if cls.opened_pack is None or cls.opened_pack[0] != signature:
+            pack_bytes = np.load(cls.filename, mmap_mode='r')
+            header_length = int(pack_bytes[:4].view("<u4")[0])
+            index = json.loads(bytes(pack_bytes[4:4 + header_length]).decode("utf-8"))
+            data_offset = 4 + header_length + (-(4 + header_length) % 8)
+            cls.opened_pack = (signature, pack_bytes[data_offset:], index)
+        return cls.opened_pack[1], cls.opened_pack[2]
+
+    @classmethod
+    def load(cls, source):
+        """ Loads a reference list from the pack file without parsing it
+
+        :param source: String of the reference list's text filename
+        :return: ReferenceImages, or None if the pack is missing or stale for this reference list
+        """
+        pack = cls.open()
+        if pack is None:
+            return None
+        data, index = pack
+        entry = index.get(source)
+        if entry is None or not os.path.isfile(source) or entry["signature"] != cls.file_signature(source):
+            return None
+
+        reference_images = ReferenceImages()
+        for name, offset, height, width in entry["images"]:
+            reference_images[name] = data[offset:offset + height * width].reshape(height, width)
+        if entry["stack"] is not None:
+            stack = entry["stack"]
+            word_count = len(reference_images) * stack["words"]
+            reference_images.load_stack(
+                stack["shape"],
+                data[stack["packed_images"]:stack["packed_images"] + word_count * 8].view("<u8").reshape(
+                    len(reference_images), stack["words"]),
+                data[stack["packed_extents"]:stack["packed_extents"] + word_count * 8].view("<u8").reshape(
+                    len(reference_images), stack["words"])
+            )
+        return reference_images
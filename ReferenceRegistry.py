@@ -0,0 +1,54 @@
+from collections.abc import Mapping
+import threading
+
+
+class ReferenceRegistry:
+    """ Process-wide cache of reference lists, so every GameObject (and every Game) shares one copy of each list
+    """
+
+    loaded = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls, filename, load):
+        """ Returns the reference list, loading it the first time it is requested
+
+        :param filename: String of the reference list's text filename
+        :param load: Function loading the reference list from its filename
+        :return: ReferenceImages of the reference list
+        """
+        with cls.lock:
+            if filename not in cls.loaded:
+                cls.loaded[filename] = load(filename)
+            return cls.loaded[filename]
+
+    @classmethod
+    def clear(cls):
+        """ Forgets every loaded reference list, e.g. after the reference files were recreated
+
+        :return: None
+        """
+        with cls.lock:
+            cls.loaded = {}
+
+
+class LazyReferences(Mapping):
+    """ Dictionary of categories to reference lists that only loads a category the first time it is used
+    """
+
+    def __init__(self, filenames, load):
+        """
+        :param filenames: Dictionary of categories to reference list filenames
+        :param load: Function loading a reference list from its filename
+        """
+        self.filenames = filenames
+        self.load = load
+
+    def __getitem__(self, category):
+        return self.load(self.filenames[category])
+
+    def __iter__(self):
+        return iter(self.filenames)
+
+    def __len__(self):
+        return len(self.filenames)
@@ -0,0 +1,46 @@
+import argparse
+import time
+
+from Game import Game
+from ScreenCapture import FrameDumpBackend, ImageDirectoryBackend, open_replay_backend
+
+
+class Replay:
+    """ Runs the full Game pipeline headless against recorded frames, as fast as they can be analysed
+    """
+
+    @staticmethod
+    def main():
+        parser = argparse.ArgumentParser(description="Replay recorded frames through the Game pipeline")
+        parser.add_argument("path", help="a .png screen shot, a directory of screen shots or a .npy frame dump")
+        parser.add_argument("--version", default="1.26", help="game version of the recorded frames")
+        parser.add_argument("--debug", type=int, default=0, help="debug mode, 1 saves debug data and full frames")
+        parser.add_argument("--hero-workers", type=int, default=0, help="processes to identify heroes with")
+        parser.add_argument("--matcher", default="exhaustive", help="exhaustive, cascade or verify")
+        parser.add_argument("--dump", help="write the directory of screen shots to this .npy frame dump and exit")
+        arguments = parser.parse_args()
+
+        if arguments.dump:
+            FrameDumpBackend.write(arguments.dump, ImageDirectoryBackend(arguments.path).filenames)
+            print("Done")
+            return
+
+        backend = open_replay_backend(arguments.path)
+        game = Game(arguments.version, (0, 0) + backend.size, arguments.debug, backend,
+                    hero_workers=arguments.hero_workers, matcher=arguments.matcher)
+
+        frame_count = 0
+        start_time = time.time()
+        while True:
+            game.main("debug")  # the sleep time is ignored to replay at full speed
+            frame_count += 1
+            if not game.capture.next_frame():
+                break
+        duration = time.time() - start_time
+        game.close()
+        print(str(frame_count) + " frames in " + str(round(duration, 3)) + " seconds, " +
+              str(round(frame_count / duration, 2)) + " frames per second")
+
+
+if __name__ == "__main__":
+    Replay.main()
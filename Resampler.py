@@ -0,0 +1,95 @@
+import numpy as np
+
+
+class Resampler:
+    """ Bilinear resizing that gives the same pixels as PIL's Image.resize(size, Image.BILINEAR) (and so as
+    scipy.misc.imresize, which the references were created with). Like PIL, the image is resized horizontally and
+    then vertically, with fixed-point weights. The weights of each source and target size are calculated once.
+    """
+
+    precision_bits = 32 - 8 - 2  # same fixed-point precision as PIL
+    coefficients = {}  # (source size, target size): (source indices, weights) of every target pixel
+
+    @classmethod
+    def resize(cls, image_array, size):
+        """ Resizes an image
+
+        :param image_array: Numpy Array of uint8 image, 2D or with channels
+        :param size: Tuple of the target (width, height), in the same order as PIL
+        :return: Numpy Array of the resized uint8 image
+        """
+        resized_array = np.asarray(image_array)
+        width, height = size
+        if resized_array.shape[1] != width:
+            resized_array = cls.resize_axis(resized_array, width, 1)
+        if resized_array.shape[0] != height:
+            resized_array = cls.resize_axis(resized_array, height, 0)
+        return resized_array
+
+    @classmethod
+    def resize_axis(cls, image_array, out_size, axis):
+        """ Resizes an image along one axis
+
+        :param image_array: Numpy Array of uint8 image
+        :param out_size: Int of the target size along the axis
+        :param axis: Int of the axis, 0 for the height and 1 for the width
+        :return: Numpy Array of the resized uint8 image
+        """
+        indices, weights = cls.get_coefficients(image_array.shape[axis], out_size)
+        # the weights of a target pixel add up to about 2 ** 22, so 255 times them still fits in an int32
+        pixels = np.ascontiguousarray(np.moveaxis(image_array, axis, 0)).astype(np.int32)
+        taps = pixels[indices]  # (out_size, taps, ...) source pixels of every target pixel
+        weights = weights.reshape(weights.shape + (1,) * (taps.ndim - 2))
+        sums = (taps * weights).sum(axis=1, dtype=np.int32) + (1 << (cls.precision_bits - 1))
+        resized_array = np.clip(sums >> cls.precision_bits, 0, 255).astype(np.uint8)
+        return np.ascontiguousarray(np.moveaxis(resized_array, 0, axis))
+
+    @classmethod
+    def get_coefficients(cls, in_size, out_size):
+        """ Returns the source pixels and fixed-point weights of every target pixel, calculating them once
+
+        :param in_size: Int of the source size
+        :param out_size: Int of the target size
+        :return: Tuple of Numpy Arrays of source indices and int weights, both (out_size, taps)
+        """
+        key = (in_size, out_size)
+        if key not in cls.coefficients:
+            cls.coefficients[key] = cls.calculate_coefficients(in_size, out_size)
+        return cls.coefficients[key]
+
+    @classmethod
+    def calculate_coefficients(cls, in_size, out_size):
+        """ Calculates the bilinear weights the same way as PIL's precompute_coeffs and normalize_coeffs_8bpc
+
+        :param in_size: Int of the source size
+        :param out_size: Int of the target size
+        :return: Tuple of Numpy Arrays of source indices and int weights, both (out_size, taps)
+        """
+        scale = in_size / out_size
+        filter_scale = max(scale, 1.0)
+        support = 1.0 * filter_scale  # the bilinear filter's support is 1
+
+        taps = int(np.ceil(support)) * 2 + 1
+        indices = np.zeros((out_size, taps), dtype=np.intp)
+        weights = np.zeros((out_size, taps), dtype=np.int32)  # unused taps keep a weight of 0
+        for out_index in range(out_size):
+            center = (out_index + 0.5) * scale
+            in_min = max(int(center - support + 0.5), 0)
+            in_max = min(int(center + support + 0.5), in_size)
+
+            pixel_weights = []
+            for in_index in range(in_min, in_max):
+                distance = abs((in_index - center + 0.5) / filter_scale)
+                pixel_weights.append(1.0 - distance if distance < 1.0 else 0.0)
+            total_weight = sum(pixel_weights)
+
+            indices[out_index] = in_min
+            for tap, pixel_weight in enumerate(pixel_weights):
+                if total_weight != 0.0:
+                    pixel_weight = pixel_weight / total_weight
+                indices[out_index, tap] = in_min + tap
+                if pixel_weight < 0:
+                    weights[out_index, tap] = int(pixel_weight * (1 << cls.precision_bits) - 0.5)
+                else:
+                    weights[out_index, tap] = int(pixel_weight * (1 << cls.precision_bits) + 0.5)
+        return indices, weights
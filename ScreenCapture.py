@@ -0,0 +1,236 @@
+from os import listdir
+from os.path import join, isdir
+from PIL import Image, ImageGrab
+import numpy as np
+
+
+class ImageGrabBackend:
+    """ Grabs the live screen with PIL's ImageGrab
+    """
+
+    def __init__(self, bbox):
+        """
+        :param bbox: Tuple of the screen's (left, top, right, bottom) pixels to watch
+        """
+        self.bbox = bbox
+        self.size = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+
+    def grab(self, box=None):
+        """ Grabs part of the watched screen
+
+        :param box: Tuple of (left, top, right, bottom) pixels relative to the watched screen, None for all of it
+        :return: Numpy Array of the grabbed pixels
+        """
+        if box is None:
+            box = (0, 0) + self.size
+        screen_box = (self.bbox[0] + box[0], self.bbox[1] + box[1], self.bbox[0] + box[2], self.bbox[1] + box[3])
+        return np.asarray(ImageGrab.grab(bbox=screen_box))
+
+
+class ImageFileBackend:
+    """ Stand-in for the live screen that grabs from a saved screen shot, e.g. on Linux or for debugging
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: String of the screen shot's filename
+        """
+        self.image_array = np.asarray(Image.open(filename).convert("RGB"))
+        self.size = (self.image_array.shape[1], self.image_array.shape[0])
+
+    def next_frame(self):
+        """ A single screen shot has no next frame
+
+        :return: False
+        """
+        return False
+
+    def grab(self, box=None):
+        """ Grabs part of the screen shot
+
+        :param box: Tuple of (left, top, right, bottom) pixels, None for all of it
+        :return: Numpy Array of the grabbed pixels
+        """
+        if box is None:
+            return self.image_array
+        return self.image_array[box[1]:box[3], box[0]:box[2]]
+
+
+class ImageDirectoryBackend(ImageFileBackend):
+    """ Replays a directory of saved screen shots in filename order, e.g. the "Potential ... fullscreen.png" files
+    saved in debug mode
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: String of the directory of .png screen shots
+        """
+        self.filenames = sorted(join(directory, filename) for filename in listdir(directory)
+                                if filename.lower().endswith(".png"))
+        self.frame_number = 0
+        super().__init__(self.filenames[0])
+
+    def next_frame(self):
+        """ Moves on to the next screen shot
+
+        :return: Boolean, False once every screen shot was replayed
+        """
+        if self.frame_number + 1 >= len(self.filenames):
+            return False
+        self.frame_number += 1
+        self.image_array = np.asarray(Image.open(self.filenames[self.frame_number]).convert("RGB"))
+        return True
+
+
+class FrameDumpBackend(ImageFileBackend):
+    """ Replays a raw dump of frames, a .npy file of uint8 (frames, height, width, 3) memory mapped so frames are
+    only read from disk as they are grabbed
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: String of the frame dump's filename
+        """
+        self.frames = np.load(filename, mmap_mode='r')
+        self.frame_number = 0
+        self.image_array = self.frames[0]
+        self.size = (self.image_array.shape[1], self.image_array.shape[0])
+
+    def next_frame(self):
+        """ Moves on to the next frame
+
+        :return: Boolean, False once every frame was replayed
+        """
+        if self.frame_number + 1 >= len(self.frames):
+            return False
+        self.frame_number += 1
+        self.image_array = self.frames[self.frame_number]
+        return True
+
+    @staticmethod
+    def write(filename, image_filenames):
+        """ Dumps screen shots into a frame dump, e.g. to replay a directory of screen shots without decoding them
+
+        :param filename: String of the frame dump's filename
+        :param image_filenames: List of the screen shots' filenames, all the same size
+        :return: None
+        """
+        first_image = np.asarray(Image.open(image_filenames[0]).convert("RGB"))
+        frames = np.lib.format.open_memmap(filename, mode="w+", dtype=np.uint8,
+                                           shape=(len(image_filenames),) + first_image.shape)
+        for frame_number, image_filename in enumerate(image_filenames):
+            frames[frame_number] = np.asarray(Image.open(image_filename).convert("RGB"))
+        frames.flush()
+        del frames
+
+
+def open_replay_backend(path):
+    """ Opens a stand-in for the live screen from a saved screen shot, a directory of screen shots or a frame dump
+
+    :param path: String of the .png screen shot, the directory or the .npy frame dump
+    :return: ImageFileBackend, ImageDirectoryBackend or FrameDumpBackend
+    """
+    if isdir(path):
+        return ImageDirectoryBackend(path)
+    elif path.lower().endswith(".npy"):
+        return FrameDumpBackend(path)
+    else:
+        return ImageFileBackend(path)
+
+
+class ScreenCapture:
+    """ Captures only the regions of the screen the analysers read, into an otherwise black full size frame
+    """
+
+    # regions closer than this are grabbed together, saving a grab call for a few extra pixels
+    merge_slack = 4096  # px
+    merged_boxes_size = 32  # region lists whose merged boxes are kept, the lists only change with the game's state
+
+    def __init__(self, backend):
+        """
+        :param backend: Object with a size (width, height) and a grab(box) function, e.g. ImageGrabBackend
+        """
+        self.backend = backend
+        self.mergedBoxes = {}  # (screen size, regions): merged boxes
+
+    def next_frame(self):
+        """ Moves a replaying backend on to its next frame, the live screen moves on by itself
+
+        :return: Boolean, False once a replay has no more frames
+        """
+        if hasattr(self.backend, "next_frame"):
+            return self.backend.next_frame()
+        return True
+
+    def grab(self, regions=None, screen_img_array=None):
+        """ Grabs the requested regions of the screen
+
+        :param regions: List of dimensions dictionaries (start_x, end_x, start_y, end_y), None for the full screen
+        :param screen_img_array: Numpy Array of a previous grab to add the regions to, None for a new frame
+        :return: Numpy Array of the screen, black outside of the requested regions
+        """
+        if regions is None:
+            return self.backend.grab()
+
+        if screen_img_array is None:
+            width, height = self.backend.size
+            screen_img_array = np.zeros((height, width, 3), dtype=np.uint8)
+        for box in self.merge_regions(regions):
+            screen_img_array[box[1]:box[3], box[0]:box[2]] = self.backend.grab(box)[:, :, :3]
+        return screen_img_array
+
+    def merge_regions(self, regions):
+        """ Clips the regions to the screen and merges overlapping or nearby regions into larger boxes,
+        merging each list of regions once
+
+        :param regions: List of dimensions dictionaries (start_x, end_x, start_y, end_y)
+        :return: List of (left, top, right, bottom) boxes
+        """
+        key = (tuple(self.backend.size), tuple((region["start_x"], region["start_y"], region["end_x"], region["end_y"])
+                                               for region in regions))
+        boxes = self.mergedBoxes.get(key)
+        if boxes is None:
+            if len(self.mergedBoxes) >= self.merged_boxes_size:
+                self.mergedBoxes.clear()
+            boxes = self.calculate_merged_boxes(regions)
+            self.mergedBoxes[key] = boxes
+        return list(boxes)
+
+    def calculate_merged_boxes(self, regions):
+        """ Clips the regions to the screen and merges overlapping or nearby regions into larger boxes
+
+        :param regions: List of dimensions dictionaries (start_x, end_x, start_y, end_y)
+        :return: List of (left, top, right, bottom) boxes
+        """
+        width, height = self.backend.size
+        boxes = []
+        for region in regions:
+            box = (max(region["start_x"], 0), max(region["start_y"], 0),
+                   min(region["end_x"], width), min(region["end_y"], height))
+            if box[0] < box[2] and box[1] < box[3]:
+                boxes.append(box)
+
+        merged = True
+        while merged:
+            merged = False
+            for first in range(len(boxes)):
+                for second in range(first + 1, len(boxes)):
+                    union = self.union_box(boxes[first], boxes[second])
+                    if self.box_area(union) <= \
+                            self.box_area(boxes[first]) + self.box_area(boxes[second]) + self.merge_slack:
+                        boxes[first] = union
+                        del boxes[second]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return boxes
+
+    @staticmethod
+    def union_box(first_box, second_box):
+        return (min(first_box[0], second_box[0]), min(first_box[1], second_box[1]),
+                max(first_box[2], second_box[2]), max(first_box[3], second_box[3]))
+
+    @staticmethod
+    def box_area(box):
+        return (box[2] - box[0]) * (box[3] - box[1])
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+class ThresholdedImage:
+    """ Thresholds one crop lazily: the channel averages are calculated once, and the plain and respawn filtered
+    black and white masks only the first time each is requested
+    """
+
+    def __init__(self, game_object, image_array):
+        """
+        :param game_object: GameObject whose threshold settings (e.g. respawnFilter) apply
+        :param image_array: Numpy Array of image
+        """
+        self.gameObject = game_object
+        self.imageArray = np.asarray(image_array)
+        self.averages = None
+        self.masks = {}
+
+    def mask(self, respawn_filter=False):
+        """ Same as GameObject.threshold_mask, calculated at most once per crop
+
+        :param respawn_filter: Boolean to apply respawn filter
+        :return: 2D Numpy Array of booleans, True for white pixels
+        """
+        if respawn_filter not in self.masks:
+            if self.averages is None:
+                self.averages = self.gameObject.channel_sums(self.imageArray) / 3
+            balance = self.gameObject.get_image_balance(self.imageArray, respawn_filter, self.averages)
+            self.masks[respawn_filter] = self.averages > balance
+        return self.masks[respawn_filter]
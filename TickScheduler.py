@@ -0,0 +1,54 @@
+import time
+
+
+class TickScheduler:
+    """ Decides how long to sleep between ticks based on what is on screen:
+    fast while the hero select countdown runs or the objective is changing, slower (backing off up to the idle
+    interval) while nothing is found on screen, and never more analysis time than the CPU budget allows
+    """
+
+    def __init__(self, fast_interval=0.25, interval=0.5, idle_interval=2.0, idle_after=10, backoff=1.5,
+                 cpu_budget=1.0):
+        """
+        :param fast_interval: Float of seconds between ticks while things are changing
+        :param interval: Float of seconds between ticks otherwise
+        :param idle_interval: Float of the most seconds between ticks while nothing is found on screen
+        :param idle_after: Int of ticks without anything found on screen before backing off
+        :param backoff: Float multiplying the interval for every further tick without anything found on screen
+        :param cpu_budget: Float of the largest share of time (0 - 1) spent analysing, 1 for no limit
+        """
+        self.fast_interval = fast_interval
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.idle_after = idle_after
+        self.backoff = backoff
+        self.cpu_budget = cpu_budget
+
+        self.idle_ticks = 0
+        self.current_interval = interval
+
+    def next_sleep_time(self, start_time, pace):
+        """ Determines the sleep time before the next tick
+
+        :param start_time: Time object of when this tick started
+        :param pace: String of how fast to tick: "fast", "normal" or "idle"
+        :return: Float of the time to sleep in seconds
+        """
+        if pace == "idle":
+            self.idle_ticks += 1
+        else:
+            self.idle_ticks = 0
+
+        if pace == "fast":
+            self.current_interval = self.fast_interval
+        elif self.idle_ticks > self.idle_after:
+            self.current_interval = min(max(self.current_interval, self.interval) * self.backoff, self.idle_interval)
+        else:
+            self.current_interval = self.interval
+
+        time_difference = time.time() - start_time
+        sleep_time = self.current_interval - time_difference
+        if 0 < self.cpu_budget < 1:
+            # e.g. a budget of 0.25 sleeps at least three times as long as the tick took
+            sleep_time = max(sleep_time, time_difference * (1 / self.cpu_budget - 1))
+        return max(sleep_time, 0)
@@ -22,6 +22,15 @@ class TimeInfo(GameObject):
         self.roundStartTime = None
         self.newly_verified_game_time = False
 
+    def capture_regions(self):
+        """ Lists the regions of the screen read when identifying the time, up to six characters to the right
+
+        :return: List of dimensions dictionaries
+        """
+        time_dimensions = self.digitDimensions.copy()
+        time_dimensions["end_x"] = time_dimensions["end_x"] + 6 * 9
+        return [time_dimensions]
+
     def reset_time(self):
         self.game_datetime = datetime.min
         self.roundStartTime = None
@@ -4,6 +4,7 @@ from os import listdir
 from os.path import isfile
 import subprocess as sp
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from autobahn.asyncio.wamp import ApplicationSession, ApplicationRunner
 import configparser
 from shutil import copyfile
@@ -11,6 +12,32 @@ import logging
 
 from AppUI import AppUI
 from Game import Game
+from GameObject import GameObject
+from ReferencePack import ReferencePack
+from ReferenceRegistry import ReferenceRegistry
+from ScreenCapture import open_replay_backend
+from TickScheduler import TickScheduler
+from Instrumentation import Instrumentation
+
+
+class LoopBroadcaster:
+    """ Stands in for the AppController on the analysis thread, handing every publish back to the event loop
+    """
+
+    def __init__(self, app_controller, loop):
+        """
+        :param app_controller: AppController that publishes to the room
+        :param loop: Event loop the AppController's session runs on
+        """
+        self.appController = app_controller
+        self.loop = loop
+
+    @property
+    def subscriptionString(self):
+        return self.appController.subscriptionString
+
+    def publish(self, topic, *args):
+        self.loop.call_soon_threadsafe(self.appController.publish, topic, *args)
 
 
 class AppController(ApplicationSession):
@@ -22,6 +49,10 @@ class AppController(ApplicationSession):
         self.subscriptionString = None
         self.subscription = None
         self.gameObject = None
+        # frame analysis runs on its own thread, so the event loop keeps serving the session and the ui
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.analysing = False
+        self.pendingEvents = []
 
         config_file = "options.ini"
         if not isfile(config_file):
@@ -35,6 +66,13 @@ class AppController(ApplicationSession):
             self.game_version = "1.26"
 
         self.bbox = (overwatch_config["start_pixel"], 0, overwatch_config["start_pixel"] + 1920, 1080)
+        self.screen_shot = overwatch_config["screen_shot"]
+        self.hero_workers = overwatch_config["hero_workers"]
+        self.matcher = overwatch_config["matcher"]
+        Instrumentation.enabled = bool(overwatch_config["instrumentation"]["enabled"])
+        self.instrumentation_export_file = overwatch_config["instrumentation"]["export_file"]
+        self.instrumentation_export_every = overwatch_config["instrumentation"]["export_every"]
+        self.scheduler_options = overwatch_config["scheduler"]
 
         self.this_map = overwatch_config["map"]
         self.this_side = overwatch_config["side"]
@@ -46,10 +84,26 @@ class AppController(ApplicationSession):
 
         config = {
             "version": config_parser.get('Standard', 'Version', fallback=1.22),
-            "debug_mode": config_parser.get('Standard', 'Debug', fallback=0),
+            "debug_mode": config_parser.getint('Standard', 'Debug', fallback=0),
             "map": config_parser.get('Debug', 'Map', fallback="junkertown"),
             "side": config_parser.get('Debug', 'Side', fallback="offense"),
-            "start_pixel": int(config_parser.get('Standard', 'StartPixel', fallback=0),)
+            "start_pixel": int(config_parser.get('Standard', 'StartPixel', fallback=0),),
+            "hero_workers": config_parser.getint('Standard', 'HeroWorkers', fallback=0),
+            "matcher": config_parser.get('Standard', 'Matcher', fallback="exhaustive"),
+            "screen_shot": config_parser.get('Debug', 'ScreenShot', fallback=""),
+            "instrumentation": {
+                "enabled": config_parser.getint('Instrumentation', 'Enabled', fallback=0),
+                "export_file": config_parser.get('Instrumentation', 'ExportFile', fallback=""),
+                "export_every": config_parser.getint('Instrumentation', 'ExportEvery', fallback=100)
+            },
+            "scheduler": {
+                "fast_interval": config_parser.getfloat('Scheduler', 'FastInterval', fallback=0.25),
+                "interval": config_parser.getfloat('Scheduler', 'Interval', fallback=0.5),
+                "idle_interval": config_parser.getfloat('Scheduler', 'IdleInterval', fallback=2.0),
+                "idle_after": config_parser.getint('Scheduler', 'IdleAfter', fallback=10),
+                "backoff": config_parser.getfloat('Scheduler', 'Backoff', fallback=1.5),
+                "cpu_budget": config_parser.getfloat('Scheduler', 'CpuBudget', fallback=1.0)
+            }
         }
         return config
 
@@ -78,31 +132,84 @@ class AppController(ApplicationSession):
                 print("Argument 1: {" + str(msg1) + "}")
                 print("Argument 2: {" + str(msg2) + "}")
 
-            if msg1 == "Hello":
-                self.gameObject.heroes.broadcast_heroes(self)
-                self.gameObject.map.broadcast_options(self)
-            elif msg1 == "heroes":
-                self.gameObject.heroes.change_heroes(msg2)
-            elif msg1 == "options":
-                self.gameObject.map.currentMapSide = msg2[0]
+            # the game is only changed between frames, so events received mid-analysis wait for it to finish
+            self.pendingEvents.append((msg1, msg2))
+            if not self.analysing:
+                self.handle_events()
 
         self.subscription = await self.subscribe(on_event, self.subscriptionString)
-        self.gameObject = Game(self.game_version, self.bbox, self.debug_mode)
+        if self.gameObject is not None:
+            await asyncio.wrap_future(self.close_game())
+        self.gameObject = self.create_game()
         self.publish(self.subscriptionString, "Hello")
         await asyncio.sleep(.5)
+        broadcaster = LoopBroadcaster(self, self.loop)
         while True:
             if not self.debug_mode:
                 sp.call('cls', shell=True)
-            sleep_time = self.gameObject.main(self)
+            self.analysing = True
+            try:
+                sleep_time = await self.loop.run_in_executor(self.executor, self.gameObject.main, broadcaster)
+            finally:
+                self.analysing = False
+            self.handle_events()
+            self.gameObject.capture.next_frame()
+            self.export_instrumentation()
             await asyncio.sleep(sleep_time)
 
+    def export_instrumentation(self):
+        """ Exports the timing summary every ExportEvery ticks, if instrumentation is enabled with an ExportFile.
+        An ExportEvery of 0 never exports
+
+        :return: None
+        """
+        if not Instrumentation.enabled or not self.instrumentation_export_file or self.instrumentation_export_every <= 0:
+            return
+        if Instrumentation.counters["ticks"] % self.instrumentation_export_every == 0:
+            Instrumentation.export(self.instrumentation_export_file)
+
+    def handle_events(self):
+        """ Applies the events received from the room, only while no frame is being analysed
+
+        :return: None
+        """
+        if self.gameObject is None:
+            return
+        pending_events = self.pendingEvents
+        self.pendingEvents = []
+        for msg1, msg2 in pending_events:
+            if msg1 == "Hello":
+                self.gameObject.heroes.broadcast_heroes(self)
+                self.gameObject.map.broadcast_options(self)
+            elif msg1 == "heroes":
+                self.gameObject.heroes.change_heroes(msg2)
+            elif msg1 == "options":
+                self.gameObject.map.currentMapSide = msg2[0]
+
+    def create_game(self):
+        capture_backend = None
+        if self.screen_shot:
+            # stand-in for the live screen: a screen shot, a directory of screen shots or a frame dump
+            capture_backend = open_replay_backend(self.screen_shot)
+        return Game(self.game_version, self.bbox, self.debug_mode, capture_backend,
+                    TickScheduler(**self.scheduler_options), self.hero_workers, self.matcher)
+
+    def close_game(self):
+        """ Closes the current game on the analysis thread, so a frame it is still analysing is finished first
+
+        :return: concurrent.futures.Future of the closing
+        """
+        game_object = self.gameObject
+        self.gameObject = None
+        return self.executor.submit(game_object.close)
+
     def unsubscribe_from_current(self):
         self.subscription.unsubscribe()
         self.subscriptionString = None
 
     # -- supplementary functions -- #
     def create_hero_references(self):
-        this_game_object = Game(self.game_version, self.bbox, self.debug_mode)
+        this_game_object = self.create_game()
 
         reference_string = [
             'Reference\\HeroImageList.txt',
@@ -128,6 +235,7 @@ class AppController(ApplicationSession):
                 condensed_source_image_list = self.condense_image(source_image_list)
                 line_to_write = file[:-4] + '::' + str(condensed_source_image_list) + '\n'
                 reference_images_file.write(line_to_write)
+            reference_images_file.close()
 
         reference_images_file = open('Reference\\HeroImageListX.txt', 'w')
         reference_images = [image for image in listdir("Reference\\Hero Image Sources X")]
@@ -142,11 +250,13 @@ class AppController(ApplicationSession):
             condensed_source_image_list = self.condense_image(source_image_list)
             line_to_write = file[:-4] + '::' + str(condensed_source_image_list) + '\n'
             reference_images_file.write(line_to_write)
+        reference_images_file.close()
 
+        self.create_reference_pack()
         print("Done")
 
     def create_images_for_hero_reference(self):
-        this_game_object = Game(self.game_version, self.bbox, self.debug_mode)
+        this_game_object = self.create_game()
         screen_img_array = this_game_object.get_screen()
         current_view = this_game_object.map.main(screen_img_array, "for_reference")
         hero_range = {"Hero Select": 7, "Tab": 13}
@@ -164,7 +274,7 @@ class AppController(ApplicationSession):
         view = "Hero Select"
         section = "extended"
 
-        this_game_object = Game(self.game_version, self.bbox, self.debug_mode)
+        this_game_object = self.create_game()
         screen_img_array = this_game_object.get_screen()
 
         this_mode_array = this_game_object.map.get_map(screen_img_array, view, section='game_type')
@@ -186,7 +296,7 @@ class AppController(ApplicationSession):
         print("Done")
 
     def create_images_for_map_reference_tab(self):
-        this_game_object = Game(self.game_version, self.bbox, self.debug_mode)
+        this_game_object = self.create_game()
         screen_img_array = this_game_object.get_screen()
         this_game_object.map.currentImageArray = this_game_object.map.get_map(screen_img_array, "Tab", section='normal')
 
@@ -197,7 +307,7 @@ class AppController(ApplicationSession):
         print("Done")
 
     def create_images_for_map_reference_objective(self):
-        this_game_object = Game(self.game_version, self.bbox, self.debug_mode)
+        this_game_object = self.create_game()
         screen_img_array = this_game_object.get_screen()
         this_game_object.map.current_map[0] = self.this_map
         this_game_object.map.currentMapSide = self.this_side
@@ -246,11 +356,13 @@ class AppController(ApplicationSession):
                 condensed_source_image_list = self.condense_image(source_image_list)
                 line_to_write = file[:-4] + '::' + str(condensed_source_image_list) + '\n'
                 reference_images_file.write(line_to_write)
+            reference_images_file.close()
+        self.create_reference_pack()
         print("Done")
 
     def create_digit_images(self):
         sp.call('cls', shell=True)
-        this_game_object = Game(self.game_version, self.bbox, self.debug_mode)
+        this_game_object = self.create_game()
         screen_img_array = this_game_object.get_screen()
         this_game_object.gameTime.main(screen_img_array, "reference")
         print("Done")
@@ -270,8 +382,18 @@ class AppController(ApplicationSession):
                 condensed_source_image_list = self.condense_image(source_image_list)
                 line_to_write = file[:-4] + '::' + str(condensed_source_image_list) + '\n'
                 reference_images_file.write(line_to_write)
+            reference_images_file.close()
+        self.create_reference_pack()
         print("Done")
 
+    @staticmethod
+    def create_reference_pack():
+        reference_dictionaries = {}
+        for reference_file in ReferencePack.sources:
+            reference_dictionaries[reference_file] = GameObject.parse_references(reference_file)
+        ReferencePack.write(reference_dictionaries)
+        ReferenceRegistry.clear()  # the next Game loads the new references
+
     @staticmethod
     def condense_image(image_list):
         new_image_list = []
@@ -306,7 +428,8 @@ def main_function():
     runner.run(AppController)
 
 
-main_function()
+if __name__ == "__main__":
+    main_function()
 
 # TODO List
 '''